@@ -0,0 +1,36 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import logging
+from typing import Any, Callable, Hashable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DispatchCache:
+    """Memoize relation data and secret lookups for the lifetime of one dispatch.
+
+    The charm is instantiated once per dispatch, so an instance of this class
+    never outlives the hook it was created in. Every hit records how many
+    hook tool calls (`relation-get`, `secret-get`, ...) the lookup would have
+    made.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[Hashable, Any] = {}
+        self.hits = 0
+        self.saved_calls = 0
+
+    def get(self, key: Hashable, loader: Callable[[], T], calls: int = 1) -> T:
+        if key in self._entries:
+            self.hits += 1
+            self.saved_calls += calls
+            return self._entries[key]
+
+        value = self._entries[key] = loader()
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        self._entries.pop(key, None)
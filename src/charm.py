@@ -6,12 +6,19 @@
 
 """A Juju Kubernetes charmed operator for GLAuth."""
 
+import hashlib
+import json
 import logging
+import os
+import time
+from functools import cached_property
+from pathlib import Path
 from typing import Any, Optional
 
 from charms.data_platform_libs.v0.data_interfaces import (
     DatabaseCreatedEvent,
     DatabaseEndpointsChangedEvent,
+    DatabaseReadOnlyEndpointsChangedEvent,
     DatabaseRequires,
 )
 from charms.glauth_k8s.v0.ldap import (
@@ -19,6 +26,7 @@ from charms.glauth_k8s.v0.ldap import (
     LdapReadyEvent,
     LdapRequestedEvent,
     LdapRequirer,
+    LdapRequirerData,
 )
 from charms.glauth_utils.v0.glauth_auxiliary import AuxiliaryProvider, AuxiliaryRequestedEvent
 from charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider
@@ -40,19 +48,36 @@ from charms.traefik_k8s.v1.ingress_per_unit import (
 from lightkube import Client
 from ops import StoredState, main
 from ops.charm import (
+    ActionEvent,
     CharmBase,
     ConfigChangedEvent,
+    EventBase,
     HookEvent,
     InstallEvent,
+    LeaderElectedEvent,
+    PebbleCheckFailedEvent,
+    PebbleCheckRecoveredEvent,
+    PebbleCustomNoticeEvent,
     PebbleReadyEvent,
+    RelationBrokenEvent,
     RelationJoinedEvent,
     RemoveEvent,
     UpdateStatusEvent,
 )
-from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus
-from ops.pebble import ChangeError
+from ops.framework import PreCommitEvent
+from ops.model import (
+    ActiveStatus,
+    BlockedStatus,
+    MaintenanceStatus,
+    ModelError,
+    WaitingStatus,
+)
+from ops.pebble import ChangeError, CheckLevel, PathError
+from sqlalchemy.exc import SQLAlchemyError
 
+from cache import DispatchCache
 from configs import (
+    ApiConfig,
     ConfigFile,
     ConfigFileData,
     DatabaseConfig,
@@ -64,25 +89,43 @@ from configs import (
 from constants import (
     CERTIFICATES_INTEGRATION_NAME,
     CERTIFICATES_TRANSFER_INTEGRATION_NAME,
+    CONFIG_DELIVERY_CONFIGMAP,
+    CONFIG_DELIVERY_PEBBLE,
+    CONFIG_SYNC_TIMEOUT,
+    CONFIG_SYNCED_NOTICE,
     DATABASE_INTEGRATION_NAME,
+    DIRECTORY_IMPORT_RESOURCE,
+    GLAUTH_API_PORT,
     GLAUTH_CONFIG_DIR,
+    GLAUTH_CONFIG_FILE,
     GLAUTH_LDAP_PORT,
     GLAUTH_LDAPS_PORT,
+    GLAUTH_METRICS_PATH,
     GRAFANA_DASHBOARD_INTEGRATION_NAME,
     INGRESS_PER_UNIT_INTEGRATION_NAME,
     LDAP_CLIENT_INTEGRATION_NAME,
+    LDAP_INTEGRATION_NAME,
     LDAPS_INGRESS_PER_UNIT_INTEGRATION_NAME,
     LOKI_API_PUSH_INTEGRATION_NAME,
+    PEER_INTEGRATION_NAME,
     PROMETHEUS_SCRAPE_INTEGRATION_NAME,
+    RESTART_IN_PROGRESS,
+    RESTART_REQUESTED,
+    WORKLOAD_CHECK_PERIOD,
+    WORKLOAD_CHECK_THRESHOLD,
     WORKLOAD_CONTAINER,
+    WORKLOAD_KILL_DELAY,
     WORKLOAD_SERVICE,
 )
-from exceptions import CertificatesError
+from database import SCHEMA_INDEXES, Operation
+from directory import DIRECTORY_FORMATS, read_directory
+from exceptions import CertificatesError, DirectoryImportError
 from integrations import (
     AuxiliaryIntegration,
     CertificatesIntegration,
     CertificatesTransferIntegration,
     LdapIntegration,
+    RollingRestartIntegration,
 )
 from kubernetes_resource import ConfigMapResource, StatefulSetResource
 from utils import (
@@ -91,13 +134,16 @@ from utils import (
     backend_not_ready,
     block_when,
     container_not_connected,
+    database_integrated,
     database_not_ready,
     integration_not_exists,
     leader_unit,
+    max_unavailable_invalid,
     service_not_ready,
     tls_certificates_not_ready,
     wait_when,
 )
+from workload import WorkloadFiles
 
 logger = logging.getLogger(__name__)
 
@@ -107,17 +153,29 @@ class GLAuthCharm(CharmBase):
 
     _stored = StoredState()
     config_changed = False
+    restart_required = False
 
     def __init__(self, *args: Any):
         super().__init__(*args)
+        # Stored state is saved at commit, so the reconcile must run before it
+        self.framework.observe(self.framework.on.pre_commit, self._on_pre_commit)
         self._stored.set_default(
             config_hash=None,
+            restart_hash=None,
+            config_delivery=None,
+            reconcile_fingerprint=None,
+            workload_files={},
+            pending_config=None,
+            config_sync_timeouts=0,
+            reconcile_pending=False,
+            schema_indexes=[],
+            restart_checks=None,
         )
+        # Only work left pending by a previous dispatch is picked up at commit
+        self._reconcile_pending = self._stored.reconcile_pending
         self._container = self.unit.get_container(WORKLOAD_CONTAINER)
-
-        self._k8s_client = Client(field_manager=self.app.name, namespace=self.model.name)
-        self._configmap = ConfigMapResource(client=self._k8s_client, name=self.app.name)
-        self._statefulset = StatefulSetResource(client=self._k8s_client, name=self.app.name)
+        self._workload_files = WorkloadFiles(self)
+        self._dispatch_cache = DispatchCache()
 
         self._db_name = f"{self.model.name}_{self.app.name}"
         self.database_requirer = DatabaseRequires(
@@ -145,11 +203,15 @@ class GLAuthCharm(CharmBase):
             mode="tcp",
         )
 
-        self.ldap_provider = LdapProvider(self)
+        self.ldap_provider = LdapProvider(self, relation_name=LDAP_INTEGRATION_NAME)
         self.framework.observe(
             self.ldap_provider.on.ldap_requested,
             self._on_ldap_requested,
         )
+        self.framework.observe(
+            self.on[LDAP_INTEGRATION_NAME].relation_broken,
+            self._on_ldap_relation_broken,
+        )
 
         self.ldap_requirer = LdapRequirer(self, LDAP_CLIENT_INTEGRATION_NAME)
         self.framework.observe(
@@ -176,12 +238,19 @@ class GLAuthCharm(CharmBase):
         )
 
         self.service_patcher = KubernetesServicePatch(
-            self, [("ldap", GLAUTH_LDAP_PORT), ("ldaps", GLAUTH_LDAPS_PORT)]
+            self,
+            [
+                ("ldap", GLAUTH_LDAP_PORT),
+                ("ldaps", GLAUTH_LDAPS_PORT),
+                ("api", GLAUTH_API_PORT),
+            ],
         )
 
         self._log_forwarder = LogForwarder(self, relation_name=LOKI_API_PUSH_INTEGRATION_NAME)
         self.metrics_endpoint = MetricsEndpointProvider(
-            self, relation_name=PROMETHEUS_SCRAPE_INTEGRATION_NAME
+            self,
+            relation_name=PROMETHEUS_SCRAPE_INTEGRATION_NAME,
+            jobs=self._metrics_jobs,
         )
         self._grafana_dashboards = GrafanaDashboardProvider(
             self, relation_name=GRAFANA_DASHBOARD_INTEGRATION_NAME
@@ -193,17 +262,35 @@ class GLAuthCharm(CharmBase):
             resource_reqs_func=self._resource_reqs_from_config,
         )
 
+        self._rolling_restart = RollingRestartIntegration(self)
+        self.framework.observe(
+            self.on[PEER_INTEGRATION_NAME].relation_changed, self._on_restart_lock_changed
+        )
+        self.framework.observe(
+            self.on[PEER_INTEGRATION_NAME].relation_departed, self._on_restart_lock_changed
+        )
+
         self.framework.observe(self.on.install, self._on_install)
+        self.framework.observe(self.on.leader_elected, self._on_leader_elected)
         self.framework.observe(self.on.config_changed, self._on_config_changed)
         self.framework.observe(self.on.update_status, self._on_update_status)
         self.framework.observe(self.on.remove, self._on_remove)
         self.framework.observe(self.on.glauth_pebble_ready, self._on_pebble_ready)
+        self.framework.observe(self.on.glauth_pebble_custom_notice, self._on_config_synced)
+        self.framework.observe(self.on.glauth_pebble_check_failed, self._on_pebble_check_failed)
+        self.framework.observe(
+            self.on.glauth_pebble_check_recovered, self._on_pebble_check_recovered
+        )
         self.framework.observe(
             self.database_requirer.on.database_created, self._on_database_created
         )
         self.framework.observe(
             self.database_requirer.on.endpoints_changed, self._on_database_changed
         )
+        self.framework.observe(
+            self.database_requirer.on.read_only_endpoints_changed,
+            self._on_database_read_only_endpoints_changed,
+        )
         self.framework.observe(self.ingress_per_unit.on.ready_for_unit, self._on_ingress_changed)
         self.framework.observe(self.ingress_per_unit.on.revoked_for_unit, self._on_ingress_changed)
 
@@ -219,18 +306,74 @@ class GLAuthCharm(CharmBase):
             self.resources_patch.on.patch_failed, self._on_resource_patch_failed
         )
 
-        self.config_file = ConfigFile(
+        # actions
+        self.framework.observe(self.on.import_directory_action, self._on_import_directory_action)
+
+        self._ldap_integration = LdapIntegration(self)
+        self._auxiliary_integration = AuxiliaryIntegration(self)
+
+    @cached_property
+    def _k8s_client(self) -> Client:
+        return Client(field_manager=self.app.name, namespace=self.model.name)
+
+    @cached_property
+    def _configmap(self) -> ConfigMapResource:
+        return ConfigMapResource(client=self._k8s_client, name=self.app.name)
+
+    @cached_property
+    def _statefulset(self) -> StatefulSetResource:
+        return StatefulSetResource(client=self._k8s_client, name=self.app.name)
+
+    @cached_property
+    def config_file(self) -> ConfigFile:
+        return ConfigFile(
             ConfigFileData(
                 base_dn=self.config.get("base_dn"),
+                debug=self.config.get("log_level") == "debug",
                 anonymousdse_enabled=self.config.get("anonymousdse_enabled"),
                 starttls_config=StartTLSConfig.load(self.config),
                 ldaps_config=LdapsConfig.load(self.config),
-                database_config=DatabaseConfig.load(self.database_requirer),
-                ldap_servers_config=LdapServerConfig.load(self.ldap_requirer),
+                api_config=ApiConfig.load(self.config),
+                database_config=self.database_config,
+                ldap_servers_config=self.ldap_server_config,
             ),
         )
-        self._ldap_integration = LdapIntegration(self)
-        self._auxiliary_integration = AuxiliaryIntegration(self)
+
+    @property
+    def _metrics_jobs(self) -> list[dict]:
+        targets = [f"*:{GLAUTH_API_PORT}"] if self.config.get("api_enabled", False) else []
+        return [
+            {
+                "metrics_path": GLAUTH_METRICS_PATH,
+                "static_configs": [{"targets": targets}],
+            }
+        ]
+
+    @property
+    def database_config(self) -> Optional[DatabaseConfig]:
+        # `relation-get` plus `secret-get` for the credentials
+        return self._dispatch_cache.get(
+            "database_config",
+            lambda: DatabaseConfig.load(
+                self.database_requirer,
+                read_replicas=self.config.get("database_read_replicas", False),
+                pooled=self.config.get("database_pooling", False),
+            ),
+            calls=2,
+        )
+
+    @property
+    def ldap_server_config(self) -> Optional[LdapServerConfig]:
+        # `relation-get` plus `secret-get` for the bind password
+        return self._dispatch_cache.get(
+            "ldap_server_config", lambda: LdapServerConfig.load(self.ldap_requirer), calls=2
+        )
+
+    def get_bind_password(self, relation_id: int) -> Optional[str]:
+        return self._dispatch_cache.get(
+            ("bind_password", relation_id),
+            lambda: self.ldap_provider.get_bind_password(relation_id),
+        )
 
     def _restart_service(self, restart: bool = False) -> None:
         if restart:
@@ -250,43 +393,250 @@ class GLAuthCharm(CharmBase):
                 "Failed to restart the service, please check the logs"
             )
 
+    def _reconcile_fingerprint(self) -> str:
+        relations = {
+            integration_name: [
+                dict(relation.data[relation.app]) if relation.app else {}
+                for relation in self.model.relations[integration_name]
+            ]
+            for integration_name in (
+                DATABASE_INTEGRATION_NAME,
+                LDAP_CLIENT_INTEGRATION_NAME,
+                CERTIFICATES_INTEGRATION_NAME,
+                INGRESS_PER_UNIT_INTEGRATION_NAME,
+                LDAPS_INGRESS_PER_UNIT_INTEGRATION_NAME,
+            )
+        }
+        inputs = {
+            "config": dict(self.config),
+            "relations": relations,
+            # The credentials are held in secrets, which the databags only reference
+            "config_file": hash(self.config_file),
+            "layer": pebble_layer(self.config).to_dict(),
+            "container_connected": self._container.can_connect(),
+        }
+        content = json.dumps(inputs, sort_keys=True, default=str)
+        return hashlib.md5(content.encode()).hexdigest()
+
+    def _handle_event_update(self, event: HookEvent) -> None:
+        fingerprint = self._reconcile_fingerprint()
+        self._stored.reconcile_fingerprint = None
+
+        if self.__handle_event_update(event):
+            self._stored.reconcile_fingerprint = fingerprint
+
     @block_when(
         backend_integration_not_exists,
         integration_not_exists(CERTIFICATES_INTEGRATION_NAME),
+        max_unavailable_invalid,
     )
     @wait_when(
         container_not_connected,
         backend_not_ready,
         tls_certificates_not_ready,
     )
-    def _handle_event_update(self, event: HookEvent) -> None:
-        self._update_glauth_config()
-        self._container.add_layer(WORKLOAD_CONTAINER, pebble_layer, combine=True)
+    def __handle_event_update(self, event: HookEvent) -> bool:
+        if not self._update_glauth_config():
+            self.unit.status = WaitingStatus("Waiting for the pod to unmount the ConfigMap")
+            return False
+
+        if self._service_definition_changed():
+            # Replanning a changed service definition restarts the service, so
+            # it goes through the rolling restart lock like any other restart
+            self.restart_required = True
+
+        if self.config_changed:
+            logger.info(
+                f"GLAuth configuration changed, {'restarting' if self.restart_required else 'reloading'} the service"
+            )
+        if (
+            self.restart_required
+            and self._service_running()
+            and not self._rolling_restart.acquire()
+        ):
+            self._restart_glauth_service()
+            self.unit.status = MaintenanceStatus("Waiting for the rolling restart lock")
+            return True
+
+        if self.restart_required:
+            self._mark_restarting()
+        self._add_workload_layer()
+        self._restart_glauth_service(restart=self.restart_required)
+        if self._stored.pending_config:
+            return True
 
-        self._restart_glauth_service(restart=self.config_changed)
         self.unit.status = ActiveStatus()
+        self._release_restart_lock()
+        return True
+
+    def _service_definition_changed(self) -> bool:
+        planned = self._container.get_plan().services.get(WORKLOAD_SERVICE)
+        if planned is None:
+            return False
+
+        service = pebble_layer(self.config).services[WORKLOAD_SERVICE]
+        return planned.to_dict() != service.to_dict()
+
+    def _add_workload_layer(self) -> None:
+        self._container.add_layer(WORKLOAD_CONTAINER, pebble_layer(self.config), combine=True)
+
+    def _service_running(self) -> bool:
+        try:
+            return self._container.get_service(WORKLOAD_SERVICE).is_running()
+        except ModelError:
+            return False
+
+    def _on_restart_lock_changed(self, event: HookEvent) -> None:
+        self._rolling_restart.grant()
+
+        if (
+            self._rolling_restart.state == RESTART_REQUESTED
+            and self.unit.name in self._rolling_restart.granted
+            and not self._stored.pending_config
+        ):
+            logger.info("Rolling restart lock acquired, restarting the service")
+            self._mark_restarting()
+            self._add_workload_layer()
+            self._restart_glauth_service(restart=True)
+            if not isinstance(self.unit.status, BlockedStatus):
+                self.unit.status = ActiveStatus()
+
+        self._release_restart_lock()
+
+    def _mark_restarting(self) -> None:
+        self._rolling_restart.restarting()
+        # Until they run again, the checks report their result from before the restart
+        checks = self._container.get_checks(level=CheckLevel.READY)
+        self._stored.restart_checks = {
+            "at": time.time(),
+            "successes": {name: check.successes for name, check in checks.items()},
+        }
+
+    def _checks_passed_since_restart(self) -> bool:
+        if not (restart := self._stored.restart_checks):
+            return True
+
+        for name, check in self._container.get_checks(level=CheckLevel.READY).items():
+            if check.failures:
+                return False
+
+            before = restart["successes"].get(name)
+            if check.successes is None or before is None:
+                # Pebble before v1.23 does not count the successes, a failing
+                # check is down once it has run `threshold` times
+                elapsed = time.time() - restart["at"]
+                if elapsed < WORKLOAD_CHECK_PERIOD * WORKLOAD_CHECK_THRESHOLD:
+                    return False
+            elif check.successes <= before:
+                return False
+
+        return True
+
+    def _release_restart_lock(self) -> None:
+        # Hand the lock over only once the restarted service passed its health checks
+        if self._rolling_restart.state != RESTART_IN_PROGRESS or self._stored.pending_config:
+            return
+
+        not_ready, msg = service_not_ready(self)
+        if not_ready:
+            logger.info(f"Holding the rolling restart lock: {msg}")
+            return
+
+        if not self._checks_passed_since_restart():
+            logger.info("Holding the rolling restart lock until the health checks run again")
+            return
+
+        self._stored.restart_checks = None
+        self._rolling_restart.release()
 
     @property
     def current_config_hash(self) -> Optional[int]:
         return self._stored.config_hash
 
-    def fetch_cm(self) -> str:
-        return self._configmap.get().data["glauth.cfg"]
+    @property
+    def config_delivery(self) -> str:
+        return self.config.get("config_delivery", CONFIG_DELIVERY_PEBBLE)
+
+    def config_synced(self) -> bool:
+        """Whether the mounted configuration file holds the pending configuration."""
+        if not (pending := self._stored.pending_config):
+            return True
+
+        try:
+            current_config = self._container.pull(GLAUTH_CONFIG_FILE).read()
+        except PathError:
+            return False
+        return hashlib.sha256(current_config.encode()).hexdigest() == pending["digest"]
+
+    def _resume_pending_config(self) -> None:
+        if not (pending := self._stored.pending_config):
+            return
+
+        if self.config_synced():
+            logger.info("The GLAuth configuration is synced, resuming the service update")
+            self._stored.pending_config = None
+            self._restart_glauth_service(restart=pending["restart"])
+            if not isinstance(self.unit.status, BlockedStatus):
+                self.unit.status = ActiveStatus()
+            self._release_restart_lock()
+            return
+
+        if time.time() - pending["since"] > CONFIG_SYNC_TIMEOUT:
+            # Count a stuck sync once, not on every event observing it
+            if not pending.get("timed_out"):
+                pending["timed_out"] = True
+                self._stored.config_sync_timeouts += 1
+            logger.error(
+                f"The GLAuth configuration is not synced after {CONFIG_SYNC_TIMEOUT} seconds, "
+                f"{self._stored.config_sync_timeouts} config sync timeouts so far"
+            )
+            self.unit.status = BlockedStatus("Configuration sync timed out, please check the logs")
 
     @leader_unit
     def _update_cm(self) -> None:
         self._configmap.patch({"glauth.cfg": self.config_file.content})
 
-    def _update_glauth_config(self) -> None:
+    def _push_config(self) -> bool:
+        # Pebble writes the file to a temporary path and renames it into place,
+        # so the workload never observes a partially written configuration
+        try:
+            self._container.push(GLAUTH_CONFIG_FILE, self.config_file.content, make_dirs=True)
+        except PathError as err:
+            # A pod created before switching to Pebble still mounts the read-only
+            # ConfigMap, the re-created pod gets the file on pebble-ready
+            logger.info(f"Failed to push the configuration file: {err}")
+            return False
+        return True
+
+    def _update_glauth_config(self) -> bool:
         config_hash = hash(self.config_file)
         if config_hash == self.current_config_hash:
-            return
+            return True
 
-        self._update_cm()
+        if self.config_delivery == CONFIG_DELIVERY_CONFIGMAP:
+            self._update_cm()
+        elif not self._push_config():
+            return False
 
         self._stored.config_hash = config_hash
         self.config_changed = True
 
+        restart_hash = self.config_file.restart_hash
+        self.restart_required = restart_hash != self._stored.restart_hash
+        self._stored.restart_hash = restart_hash
+        return True
+
+    def _configure_config_delivery(self) -> None:
+        if self._stored.config_delivery != self.config_delivery:
+            # Force the configuration file to be delivered again through the new channel
+            self._stored.config_hash = None
+            self._stored.config_delivery = self.config_delivery
+
+        if self.config_delivery == CONFIG_DELIVERY_CONFIGMAP:
+            self._mount_glauth_config()
+        else:
+            self._unmount_glauth_config()
+
     @leader_unit
     def _mount_glauth_config(self) -> None:
         pod_spec_patch = {
@@ -312,10 +662,54 @@ class GLAuthCharm(CharmBase):
         patch_data = {"spec": {"template": {"spec": pod_spec_patch}}}
         self._statefulset.patch(patch_data)
 
+    @leader_unit
+    def _unmount_glauth_config(self) -> None:
+        pod_spec_patch = {
+            "containers": [
+                {
+                    "name": WORKLOAD_CONTAINER,
+                    "volumeMounts": [
+                        {
+                            "mountPath": str(GLAUTH_CONFIG_DIR),
+                            "$patch": "delete",
+                        },
+                    ],
+                },
+            ],
+            "volumes": [
+                {
+                    "name": "glauth-config",
+                    "$patch": "delete",
+                },
+            ],
+        }
+        patch_data = {"spec": {"template": {"spec": pod_spec_patch}}}
+        self._statefulset.patch(patch_data)
+
+    @leader_unit
+    def _configure_termination(self) -> None:
+        # Once a pod is terminating it is removed from the Service endpoints, the
+        # preStop sleep keeps GLAuth serving the in-flight operations meanwhile
+        drain_timeout = self.config.get("drain_timeout", 30)
+        pod_spec_patch = {
+            "terminationGracePeriodSeconds": drain_timeout + WORKLOAD_KILL_DELAY + 5,
+            "containers": [
+                {
+                    "name": WORKLOAD_CONTAINER,
+                    "lifecycle": {
+                        "preStop": {"sleep": {"seconds": drain_timeout}},
+                    },
+                },
+            ],
+        }
+        patch_data = {"spec": {"template": {"spec": pod_spec_patch}}}
+        self._statefulset.patch(patch_data)
+
     @leader_unit
     def _on_install(self, event: InstallEvent) -> None:
         self._configmap.create()
-        self._update_glauth_config()
+        if self.config_delivery == CONFIG_DELIVERY_CONFIGMAP:
+            self._update_glauth_config()
 
     @leader_unit
     def _on_remove(self, event: RemoveEvent) -> None:
@@ -323,10 +717,21 @@ class GLAuthCharm(CharmBase):
 
     def _on_database_created(self, event: DatabaseCreatedEvent) -> None:
         self.unit.status = MaintenanceStatus("Configuring resources")
+        # Bind accounts and indexes created in a previous database no longer exist
+        self._ldap_integration.invalidate_bind_accounts()
+        self._stored.schema_indexes = []
         self._handle_event_update(event)
         self.auxiliary_provider.update_relation_app_data(
             data=self._auxiliary_integration.auxiliary_data,
         )
+        self._provision_ldap_relations(event)
+        self._tune_database_schema(event)
+
+    def _on_database_read_only_endpoints_changed(
+        self, event: DatabaseReadOnlyEndpointsChangedEvent
+    ) -> None:
+        if self.config.get("database_read_replicas", False):
+            self._handle_event_update(event)
 
     def _on_database_changed(self, event: DatabaseEndpointsChangedEvent) -> None:
         self.unit.status = MaintenanceStatus("Configuring resources")
@@ -334,18 +739,50 @@ class GLAuthCharm(CharmBase):
         self.auxiliary_provider.update_relation_app_data(
             data=self._auxiliary_integration.auxiliary_data,
         )
+        self._provision_ldap_relations(event)
+
+    def _on_leader_elected(self, event: LeaderElectedEvent) -> None:
+        self._provision_ldap_relations(event)
+        self._tune_database_schema(event)
+
+    def _on_pebble_check_failed(self, event: PebbleCheckFailedEvent) -> None:
+        logger.warning(f"GLAuth health check {event.info.name} is failing")
+        self.unit.status = WaitingStatus(f"Failing health check {event.info.name}")
+        self._stored.reconcile_fingerprint = None
+
+    def _on_pebble_check_recovered(self, event: PebbleCheckRecoveredEvent) -> None:
+        logger.info(f"GLAuth health check {event.info.name} recovered")
+        self._handle_event_update(event)
+        self._release_restart_lock()
+
+    def _on_config_synced(self, event: PebbleCustomNoticeEvent) -> None:
+        if event.notice.key == CONFIG_SYNCED_NOTICE:
+            self._resume_pending_config()
 
     def _on_update_status(self, event: UpdateStatusEvent) -> None:
+        self._resume_pending_config()
+        self._on_restart_lock_changed(event)
+        if self._reconcile_fingerprint() == self._stored.reconcile_fingerprint:
+            logger.debug("No reconcile inputs changed since the last update, skipping")
+            return
+
         self._handle_event_update(event)
 
     def _on_config_changed(self, event: ConfigChangedEvent) -> None:
         self.unit.status = MaintenanceStatus("Configuring resources")
+        self._configure_config_delivery()
+        self._configure_termination()
+        self.metrics_endpoint.update_scrape_job_spec(self._metrics_jobs)
         self._handle_event_update(event)
         self.ldap_provider.update_relations_app_data(self._ldap_integration.provider_base_data)
 
     def _on_pebble_ready(self, event: PebbleReadyEvent) -> None:
         self.unit.status = MaintenanceStatus("Configuring resources")
-        self._mount_glauth_config()
+        # The workload container may have been recreated without the pushed files
+        if self.config_delivery == CONFIG_DELIVERY_PEBBLE:
+            self._stored.config_hash = None
+        self._workload_files.reset()
+        self._configure_config_delivery()
         self.__on_pebble_ready(event)
 
     @wait_when(container_not_connected)
@@ -360,6 +797,43 @@ class GLAuthCharm(CharmBase):
 
         self._handle_event_update(event)
 
+    def _reconcile(self, event: EventBase) -> None:
+        """Converge the unit to the state derived from all inputs in a single pass."""
+        self._stored.reconcile_pending = False
+        logger.info("Reconciling the work left pending by previous events")
+
+        if self._container.can_connect():
+            try:
+                self._certs_integration.update_certificates()
+            except CertificatesError:
+                self.unit.status = BlockedStatus(
+                    "Failed to update the TLS certificates, please check the logs"
+                )
+                return
+
+        self._handle_event_update(event)
+        self._provision_ldap_relations(event)
+        self._tune_database_schema(event)
+        self._update_auxiliary_data(event)
+        if self.unit.is_leader():
+            self.ldap_provider.update_relations_app_data(self._ldap_integration.provider_base_data)
+        self._certs_transfer_integration.transfer_certificates(
+            self._certs_integration.cert_data,
+        )
+
+    def _on_pre_commit(self, event: PreCommitEvent) -> None:
+        # An action must not restart the workload or patch the StatefulSet as a
+        # side effect, the pending work is left to the next hook
+        if self._reconcile_pending and not os.environ.get("JUJU_ACTION_NAME"):
+            self._reconcile_pending = False
+            self._reconcile(event)
+
+        if self._dispatch_cache.hits:
+            logger.debug(
+                f"Dispatch cache served {self._dispatch_cache.hits} lookups, "
+                f"saving {self._dispatch_cache.saved_calls} hook tool calls"
+            )
+
     def _on_resource_patch_failed(self, event: K8sResourcePatchFailedEvent) -> None:
         logger.error(f"Failed to patch resource constraints: {event.message}")
         self.unit.status = BlockedStatus(event.message)
@@ -381,6 +855,104 @@ class GLAuthCharm(CharmBase):
             self._ldap_integration.provider_data,
             relation_id=event.relation.id,
         )
+        self._dispatch_cache.invalidate(("bind_password", event.relation.id))
+
+    @leader_unit
+    @database_integrated
+    @wait_when(database_not_ready, service_not_ready)
+    def _provision_ldap_relations(self, event: HookEvent) -> None:
+        """Provision the bind accounts of all ldap integrations in a single transaction."""
+        if self.ldap_server_config:
+            return
+
+        requests = {}
+        for relation in self.model.relations[LDAP_INTEGRATION_NAME]:
+            if not relation.app or not (relation_data := relation.data[relation.app]):
+                continue
+            requirer_data = LdapRequirerData(**relation_data)
+            requests[relation.id] = (requirer_data.user, requirer_data.group)
+
+        if not requests:
+            return
+
+        bind_accounts = self._ldap_integration.load_bind_accounts(requests)
+        for relation_id, bind_account in bind_accounts.items():
+            self.ldap_provider.update_relations_app_data(
+                self._ldap_integration.build_provider_data(bind_account),
+                relation_id=relation_id,
+            )
+            self._dispatch_cache.invalidate(("bind_password", relation_id))
+
+    @leader_unit
+    @database_integrated
+    @wait_when(database_not_ready, service_not_ready)
+    def _tune_database_schema(self, event: HookEvent) -> None:
+        """Create the indexes serving the lookups of GLAuth, once per database."""
+        ensured = set(self._stored.schema_indexes)
+        if not (
+            missing := {
+                name: index for name, index in SCHEMA_INDEXES.items() if name not in ensured
+            }
+        ):
+            return
+
+        database_config = self.database_config
+        with Operation(database_config.dsn, pooled=database_config.pooled) as op:
+            indexes = op.create_indexes(missing)
+
+        self._stored.schema_indexes = sorted(ensured | indexes.keys())
+        if created := [name for name, created in indexes.items() if created]:
+            logger.info(f"Created the database indexes: {', '.join(created)}")
+
+        if len(indexes) < len(missing):
+            # GLAuth has not created all of its tables yet
+            self._stored.reconcile_pending = True
+
+    def _on_import_directory_action(self, event: ActionEvent) -> None:
+        if not self.unit.is_leader():
+            event.fail("The directory can only be imported by the leader unit")
+            return
+
+        if not (database_config := self.database_config):
+            event.fail("The database integration is not ready")
+            return
+
+        format_ = event.params.get("format")
+        if path_param := event.params.get("path"):
+            path = Path(path_param)
+            format_ = format_ or path.suffix.lstrip(".").lower()
+        elif not format_:
+            # Juju stores the resource under a fixed file name whatever its format
+            event.fail(
+                f"The format is required to import the {DIRECTORY_IMPORT_RESOURCE} resource"
+            )
+            return
+        else:
+            try:
+                path = self.model.resources.fetch(DIRECTORY_IMPORT_RESOURCE)
+            except (ModelError, NameError) as e:
+                event.fail(
+                    f"No path given and the {DIRECTORY_IMPORT_RESOURCE} resource is missing: {e}"
+                )
+                return
+
+        if format_ not in DIRECTORY_FORMATS:
+            event.fail(f"Unknown directory format '{format_}', use one of {DIRECTORY_FORMATS}")
+            return
+
+        event.log(f"Importing the {format_} directory file {path}")
+        try:
+            with Operation(database_config.dsn, pooled=database_config.pooled) as op:
+                summary = op.import_directory(read_directory(path, format_), event.log)
+        except (DirectoryImportError, OSError, UnicodeDecodeError, SQLAlchemyError) as e:
+            event.fail(f"Failed to import the directory: {e}")
+            return
+
+        logger.info(f"Imported the directory file {path}: {summary}")
+        event.set_results(summary)
+
+    def _on_ldap_relation_broken(self, event: RelationBrokenEvent) -> None:
+        self._ldap_integration.invalidate_bind_accounts(event.relation.id)
 
     def _on_ldap_ready(self, event: LdapReadyEvent) -> None:
         self._handle_event_update(event)
@@ -392,6 +964,13 @@ class GLAuthCharm(CharmBase):
             data=self._auxiliary_integration.auxiliary_data,
         )
 
+    @database_integrated
+    @wait_when(database_not_ready)
+    def _update_auxiliary_data(self, event: EventBase) -> None:
+        self.auxiliary_provider.update_relation_app_data(
+            data=self._auxiliary_integration.auxiliary_data,
+        )
+
     @leader_unit
     @wait_when(container_not_connected)
     def _on_ingress_changed(
@@ -401,6 +980,7 @@ class GLAuthCharm(CharmBase):
 
     @wait_when(container_not_connected)
     def _on_cert_changed(self, event: CertificateAvailableEvent) -> None:
+        self._certs_integration.invalidate_snapshot()
         try:
             self._certs_integration.update_certificates()
         except CertificatesError:
@@ -416,7 +996,7 @@ class GLAuthCharm(CharmBase):
 
     def _on_certificates_transfer_relation_joined(self, event: RelationJoinedEvent) -> None:
         if not self._certs_integration.certs_ready():
-            event.defer()
+            # The certificates are transferred once they are available
             return
 
         self._certs_transfer_integration.transfer_certificates(
@@ -2,22 +2,72 @@
 # See LICENSE file for licensing details.
 
 import hashlib
+import json
+import math
+import tomllib
 from dataclasses import asdict, dataclass
+from decimal import Decimal
+from functools import cache
 from pathlib import Path
 from typing import Any, Mapping, Optional
+from urllib.parse import urlencode
 
 from charms.glauth_k8s.v0.ldap import LdapProviderData, LdapRequirer
-from jinja2 import Template
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template
+from lightkube.utils.quantity import parse_quantity
 from ops.pebble import Layer
 
 from constants import (
+    DATABASE_CONNECT_TIMEOUT,
+    GLAUTH_API_PORT,
     GLAUTH_COMMANDS,
+    GLAUTH_DSN_TEMPLATE,
+    GLAUTH_LDAP_PORT,
+    GLAUTH_LDAPS_PORT,
+    LDAP_HEALTH_CHECK,
+    LDAPS_HEALTH_CHECK,
     POSTGRESQL_DSN_TEMPLATE,
     SERVER_CERT,
     SERVER_KEY,
+    WORKLOAD_CHECK_PERIOD,
+    WORKLOAD_CHECK_THRESHOLD,
+    WORKLOAD_KILL_DELAY,
     WORKLOAD_SERVICE,
 )
 
+# GLAuth can only pick up changes to these sections by restarting the service
+RESTART_REQUIRED_SECTIONS = ("ldap", "ldaps", "backends", "api")
+
+# The share of the memory limit the Go heap may grow to
+GOMEMLIMIT_RATIO = Decimal("0.9")
+
+TEMPLATES_DIR = Path("templates")
+GLAUTH_CONFIG_TEMPLATE = "glauth.cfg.j2"
+
+
+@cache
+def _load_template() -> Template:
+    # The compiled template is cached on disk keyed by the template checksum, so
+    # it is only compiled again when the charm ships a different template
+    env = Environment(
+        loader=FileSystemLoader(TEMPLATES_DIR),
+        bytecode_cache=FileSystemBytecodeCache(),
+    )
+    return env.get_template(GLAUTH_CONFIG_TEMPLATE)
+
+
+@cache
+def _template_checksum() -> str:
+    return hashlib.md5((TEMPLATES_DIR / GLAUTH_CONFIG_TEMPLATE).read_bytes()).hexdigest()
+
+
+def _json_default(obj: Any) -> Any:
+    return vars(obj) if hasattr(obj, "__dict__") else str(obj)
+
+
+def _split_endpoints(endpoints: Optional[str]) -> list[str]:
+    return [endpoint for endpoint in (endpoints or "").replace(" ", "").split(",") if endpoint]
+
 
 @dataclass
 class DatabaseConfig:
@@ -25,18 +75,62 @@ class DatabaseConfig:
     database: Optional[str] = None
     username: Optional[str] = None
     password: Optional[str] = None
+    read_only_endpoints: Optional[str] = None
+    pooled: bool = False
+
+    @property
+    def endpoints(self) -> list[str]:
+        return _split_endpoints(self.endpoint)
+
+    @property
+    def read_only_endpoints_list(self) -> list[str]:
+        return _split_endpoints(self.read_only_endpoints)
 
     @property
     def dsn(self) -> str:
+        # Every host is listed, psycopg fails over to the next one at connect time
         return POSTGRESQL_DSN_TEMPLATE.substitute(
             username=self.username,
             password=self.password,
-            endpoint=self.endpoint,
+            hosts="&".join(f"host={endpoint}" for endpoint in self.endpoints),
             database=self.database,
         )
 
+    @property
+    def glauth_dsn(self) -> str:
+        """The DSN of the GLAuth backend, which only ever reads from the database.
+
+        The GLAuth postgres plugin connects through lib/pq, which takes a single
+        host and sends unknown parameters to the server as startup parameters.
+        The libpq failover and keepalive settings are left to the charm's engine.
+        """
+        params: dict[str, Any] = {"connect_timeout": DATABASE_CONNECT_TIMEOUT}
+        if self.pooled:
+            # A transaction pooler hands each transaction a different server
+            # connection, so named prepared statements must never be created
+            params["binary_parameters"] = "yes"
+
+        endpoints = self.endpoints
+        if read_only_endpoints := self.read_only_endpoints_list:
+            # The read-only endpoint published by the database, e.g. the replicas
+            # service of postgresql-k8s, balances the searches over the standbys
+            endpoints = read_only_endpoints
+
+        dsn = GLAUTH_DSN_TEMPLATE.substitute(
+            username=self.username,
+            password=self.password,
+            endpoint=next(iter(endpoints), ""),
+            database=self.database,
+        )
+        return f"{dsn}&{urlencode(params)}"
+
     @classmethod
-    def load(cls, requirer: Any) -> Optional["DatabaseConfig"]:
+    def load(
+        cls,
+        requirer: Any,
+        read_replicas: bool = False,
+        pooled: bool = False,
+    ) -> Optional["DatabaseConfig"]:
         if not (database_integrations := requirer.relations):
             return None
 
@@ -48,6 +142,10 @@ class DatabaseConfig:
             database=requirer.database,
             username=integration_data.get("username"),
             password=integration_data.get("password"),
+            read_only_endpoints=(
+                integration_data.get("read-only-endpoints") if read_replicas else None
+            ),
+            pooled=pooled,
         )
 
 
@@ -91,13 +189,27 @@ class LdapsConfig:
         )
 
 
+@dataclass
+class ApiConfig:
+    enabled: bool = False
+    port: int = GLAUTH_API_PORT
+
+    @classmethod
+    def load(cls, config: Mapping[str, Any]) -> "ApiConfig":
+        return ApiConfig(
+            enabled=config.get("api_enabled", False),
+        )
+
+
 @dataclass(frozen=True)
 class ConfigFileData:
     base_dn: Optional[str] = None
+    debug: bool = False
     anonymousdse_enabled: bool = False
     database_config: Optional[DatabaseConfig] = None
     starttls_config: Optional[StartTLSConfig] = None
     ldaps_config: Optional[LdapsConfig] = None
+    api_config: Optional[ApiConfig] = None
     ldap_servers_config: Optional[LdapServerConfig] = None
 
 
@@ -112,10 +224,7 @@ class ConfigFile:
             self._content = self.render()
         return self._content
 
-    def render(self) -> str:
-        with open("templates/glauth.cfg.j2", mode="r") as file:
-            template = Template(file.read())
-
+    def _template_context(self) -> dict[str, Any]:
         database_config = (
             asdict(self._config_file.database_config)
             if self._config_file.database_config
@@ -130,30 +239,113 @@ class ConfigFile:
         ldaps_config = (
             asdict(self._config_file.ldaps_config) if self._config_file.ldaps_config else None
         )
-        return template.render(
-            base_dn=self._config_file.base_dn,
-            anonymousdse_enabled=self._config_file.anonymousdse_enabled,
-            database=database_config,
-            ldap_servers=ldap_servers_config,
-            starttls=starttls_config,
-            ldaps=ldaps_config,
-        )
+        api_config = asdict(self._config_file.api_config) if self._config_file.api_config else None
+        return {
+            "base_dn": self._config_file.base_dn,
+            "database_dsn": (
+                self._config_file.database_config.glauth_dsn
+                if self._config_file.database_config
+                else None
+            ),
+            "debug": self._config_file.debug,
+            "anonymousdse_enabled": self._config_file.anonymousdse_enabled,
+            "database": database_config,
+            "ldap_servers": ldap_servers_config,
+            "starttls": starttls_config,
+            "ldaps": ldaps_config,
+            "api": api_config,
+        }
+
+    def render(self) -> str:
+        return _load_template().render(**self._template_context())
 
     def __hash__(self) -> int:
         # Do not use the builtin `hash` function, the salt changes on every interpreter
-        # run making it useless in charms
-        return int(hashlib.md5(self.content.encode()).hexdigest(), 16)
+        # run making it useless in charms.
+        # Hash the template inputs instead of the rendered content, so that unchanged
+        # inputs never need to be rendered. The inputs derived in code, e.g. the
+        # GLAuth DSN, are covered so that a charm upgrade changing them is delivered
+        inputs = json.dumps(
+            [_template_checksum(), self._template_context()],
+            sort_keys=True,
+            default=_json_default,
+        )
+        return int(hashlib.md5(inputs.encode()).hexdigest(), 16)
 
+    @property
+    def restart_hash(self) -> int:
+        """The hash of the listener and backend sections which can not be hot-reloaded."""
+        config = tomllib.loads(self.content)
+        sections = {section: config.get(section) for section in RESTART_REQUIRED_SECTIONS}
+        content = json.dumps(sections, sort_keys=True)
+        return int(hashlib.md5(content.encode()).hexdigest(), 16)
 
-pebble_layer = Layer({
-    "summary": "GLAuth layer",
-    "description": "pebble layer for GLAuth service",
-    "services": {
-        WORKLOAD_SERVICE: {
+
+def _quantity(value: Optional[str]) -> Optional[Decimal]:
+    # An invalid limit blocks the unit through the resources patch instead
+    try:
+        return parse_quantity(value)
+    except ValueError:
+        return None
+
+
+def _go_runtime_environment(config: Mapping[str, Any]) -> dict[str, str]:
+    """Size the Go runtime to the container limits instead of the node."""
+    environment = {}
+
+    if cpu := _quantity(config.get("cpu")):
+        environment["GOMAXPROCS"] = str(max(1, math.ceil(cpu)))
+
+    if memory := _quantity(config.get("memory")):
+        # Leave headroom for the non-heap memory, so that the garbage collector
+        # works harder before the container hits the OOM killer
+        environment["GOMEMLIMIT"] = str(int(memory * GOMEMLIMIT_RATIO))
+
+    if gogc := config.get("gogc"):
+        environment["GOGC"] = str(gogc)
+
+    return environment
+
+
+def _health_checks(config: Mapping[str, Any]) -> dict[str, dict]:
+    # Checks at the ready level back the Kubernetes readiness probe of the workload.
+    # A combined layer can not drop a check, so the LDAPS check falls back to
+    # probing the LDAP listener while LDAPS is disabled
+    listeners = {
+        LDAP_HEALTH_CHECK: GLAUTH_LDAP_PORT,
+        LDAPS_HEALTH_CHECK: (
+            GLAUTH_LDAPS_PORT if config.get("ldaps_enabled", False) else GLAUTH_LDAP_PORT
+        ),
+    }
+
+    return {
+        name: {
             "override": "replace",
-            "summary": "GLAuth Operator layer",
-            "startup": "disabled",
-            "command": GLAUTH_COMMANDS,
+            "level": "ready",
+            "period": f"{WORKLOAD_CHECK_PERIOD}s",
+            "timeout": "3s",
+            "threshold": WORKLOAD_CHECK_THRESHOLD,
+            "tcp": {"port": port},
         }
-    },
-})
+        for name, port in listeners.items()
+    }
+
+
+def pebble_layer(config: Mapping[str, Any]) -> Layer:
+    checks = _health_checks(config)
+    return Layer({
+        "summary": "GLAuth layer",
+        "description": "pebble layer for GLAuth service",
+        "services": {
+            WORKLOAD_SERVICE: {
+                "override": "replace",
+                "summary": "GLAuth Operator layer",
+                "startup": "disabled",
+                "command": GLAUTH_COMMANDS,
+                "environment": _go_runtime_environment(config),
+                "kill-delay": f"{WORKLOAD_KILL_DELAY}s",
+                "on-check-failure": dict.fromkeys(checks, "restart"),
+            }
+        },
+        "checks": checks,
+    })
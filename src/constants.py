@@ -4,6 +4,7 @@
 from pathlib import Path, PurePath
 from string import Template
 
+LDAP_INTEGRATION_NAME = "ldap"
 LDAP_CLIENT_INTEGRATION_NAME = "ldap-client"
 DATABASE_INTEGRATION_NAME = "pg-database"
 INGRESS_PER_UNIT_INTEGRATION_NAME = "ingress"
@@ -13,19 +14,57 @@ PROMETHEUS_SCRAPE_INTEGRATION_NAME = "metrics-endpoint"
 GRAFANA_DASHBOARD_INTEGRATION_NAME = "grafana-dashboard"
 CERTIFICATES_INTEGRATION_NAME = "certificates"
 CERTIFICATES_TRANSFER_INTEGRATION_NAME = "send-ca-cert"
+PEER_INTEGRATION_NAME = "glauth-peers"
+
+RESTART_KEY = "restart"
+RESTART_GRANTED_KEY = "restart-granted"
+RESTART_REQUESTED = "requested"
+RESTART_IN_PROGRESS = "restarting"
+
+# The ledger of the provisioned bind accounts, in the peer application databag
+BIND_ACCOUNTS_KEY = "bind-accounts"
 
 GLAUTH_CONFIG_DIR = PurePath("/etc/config")
 GLAUTH_CONFIG_FILE = GLAUTH_CONFIG_DIR / "glauth.cfg"
 GLAUTH_COMMANDS = f"glauth -c {GLAUTH_CONFIG_FILE}"
 GLAUTH_LDAP_PORT = 3893
 GLAUTH_LDAPS_PORT = 3894
+GLAUTH_API_PORT = 5555
+GLAUTH_METRICS_PATH = "/metrics"
+
+CONFIG_DELIVERY_PEBBLE = "pebble"
+CONFIG_DELIVERY_CONFIGMAP = "configmap"
+# Seconds to wait for the kubelet to sync the mounted ConfigMap
+CONFIG_SYNC_TIMEOUT = 300
+# Notifying this Pebble notice in the workload, e.g. from a file watcher, resumes a
+# configuration update waiting for the kubelet sync
+CONFIG_SYNCED_NOTICE = "canonical.com/glauth/config-synced"
 
 WORKLOAD_CONTAINER = "glauth"
 WORKLOAD_SERVICE = "glauth"
+LDAP_HEALTH_CHECK = "glauth-ldap"
+LDAPS_HEALTH_CHECK = "glauth-ldaps"
+# Seconds GLAuth is given to exit after SIGTERM before it is killed. GLAuth exits
+# on SIGTERM right away, so this bounds a stuck shutdown and drains nothing
+WORKLOAD_KILL_DELAY = 10
+WORKLOAD_CHECK_PERIOD = 10  # seconds
+WORKLOAD_CHECK_THRESHOLD = 3
 
 DEFAULT_UID = 5001
 DEFAULT_GID = 5501
-POSTGRESQL_DSN_TEMPLATE = Template("postgresql+psycopg://$username:$password@$endpoint/$database")
+POSTGRESQL_DSN_TEMPLATE = Template("postgresql+psycopg://$username:$password@/$database?$hosts")
+GLAUTH_DSN_TEMPLATE = Template(
+    "postgres://$username:$password@$endpoint/$database?sslmode=disable"
+)
+DATABASE_CONNECT_TIMEOUT = 10  # seconds
+DATABASE_STATEMENT_TIMEOUT = 30000  # milliseconds
+# Detect a dead database host within a minute instead of the kernel default of hours
+DATABASE_KEEPALIVES = {
+    "keepalives": 1,
+    "keepalives_idle": 30,  # seconds
+    "keepalives_interval": 10,  # seconds
+    "keepalives_count": 3,
+}
 
 CERTIFICATE_FILE = Path("/etc/ssl/certs/ca-certificates.crt")
 PRIVATE_KEY_DIR = Path("/etc/ssl/private")
@@ -34,3 +73,7 @@ LOCAL_CA_CERTS_DIR = Path("/usr/local/share/ca-certificates")
 SERVER_CA_CERT = LOCAL_CA_CERTS_DIR / "glauth-ca.crt"
 SERVER_KEY = PRIVATE_KEY_DIR / "glauth-server.key"
 SERVER_CERT = LOCAL_CA_CERTS_DIR / "glauth-server.crt"
+
+DIRECTORY_IMPORT_RESOURCE = "directory-import"
+# Records streamed between two progress messages of the import action
+DIRECTORY_IMPORT_PROGRESS_INTERVAL = 10000
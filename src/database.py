@@ -2,13 +2,205 @@
 # See LICENSE file for licensing details.
 
 import logging
-from typing import Any, Optional, Type
+from typing import Any, Callable, Iterable, Iterator, Mapping, Optional, Sequence, Type
 
-from sqlalchemy import ColumnExpressionArgument, Integer, String, create_engine, select
+from sqlalchemy import (
+    ColumnExpressionArgument,
+    Engine,
+    Insert,
+    Integer,
+    String,
+    create_engine,
+    exists,
+    literal,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from sqlalchemy.pool import NullPool
+
+from constants import (
+    DATABASE_CONNECT_TIMEOUT,
+    DATABASE_KEEPALIVES,
+    DATABASE_STATEMENT_TIMEOUT,
+    DIRECTORY_IMPORT_PROGRESS_INTERVAL,
+)
+from directory import DirectoryRecord, DirectoryUser
+from exceptions import DirectoryImportError
 
 logger = logging.getLogger(__name__)
 
+_engines: dict[tuple[str, bool], Engine] = {}
+
+# The lookups of the GLAuth postgres plugin beyond the unique constraints on `name`,
+# keyed by index name with the table and the indexed expressions
+SCHEMA_INDEXES = {
+    "users_lower_name_idx": ("users", "lower(name)"),
+    "users_uidnumber_idx": ("users", "uidnumber"),
+    "users_primarygroup_idx": ("users", "primarygroup"),
+    "ldapgroups_lower_name_idx": ("ldapgroups", "lower(name)"),
+    "ldapgroups_gidnumber_idx": ("ldapgroups", "gidnumber"),
+    "capabilities_userid_idx": ("capabilities", "userid"),
+    "includegroups_parentgroupid_idx": ("includegroups", "parentgroupid"),
+    "includegroups_includegroupid_idx": ("includegroups", "includegroupid"),
+}
+
+
+def _get_engine(dsn: str, pooled: bool = False) -> Engine:
+    if engine := _engines.get((dsn, pooled)):
+        return engine
+
+    connect_args = {
+        "connect_timeout": DATABASE_CONNECT_TIMEOUT,
+        # Skip the hosts which became standbys after a switchover
+        "target_session_attrs": "read-write",
+        **DATABASE_KEEPALIVES,
+    }
+    if pooled:
+        # The connection pooler multiplexes the transactions onto its server
+        # connections: hand every connection back to it once the operation is
+        # done, never prepare statements, and skip the startup `options` which
+        # PgBouncer refuses. The statement timeout is set per transaction instead.
+        engine = create_engine(
+            dsn,
+            poolclass=NullPool,
+            connect_args={**connect_args, "prepare_threshold": None},
+        )
+    else:
+        # Reuse the connection pool across operations instead of a new handshake per operation
+        engine = create_engine(
+            dsn,
+            pool_size=1,
+            max_overflow=1,
+            pool_timeout=DATABASE_CONNECT_TIMEOUT,
+            connect_args={
+                **connect_args,
+                "options": f"-c statement_timeout={DATABASE_STATEMENT_TIMEOUT}",
+            },
+        )
+
+    _engines[(dsn, pooled)] = engine
+    return engine
+
+
+# Every record of a directory import is streamed into a single staging table,
+# since a connection runs one COPY at a time. `kind` is one of `user`, `group`,
+# `member` (the `name` user is a member of the `target` group), `include` (the
+# `name` group is included in the `target` group) or `capability`.
+DIRECTORY_STAGING_TABLE = "directory_import"
+DIRECTORY_STAGING_COLUMNS = (
+    ("kind", "text"),
+    ("name", "text"),
+    ("number", "integer"),
+    ("primarygroup", "integer"),
+    ("givenname", "text"),
+    ("sn", "text"),
+    ("mail", "text"),
+    ("loginshell", "text"),
+    ("homedirectory", "text"),
+    ("passsha256", "text"),
+    ("passbcrypt", "text"),
+    ("target", "text"),
+    ("action", "text"),
+    ("object", "text"),
+)
+
+# The set-based merges of the staging table, in order: the groups and users
+# first, so that the memberships and capabilities resolve against them
+DIRECTORY_MERGES = {
+    "groups": f"""
+        INSERT INTO ldapgroups (name, gidnumber)
+        SELECT DISTINCT ON (name) name, number
+        FROM {DIRECTORY_STAGING_TABLE} WHERE kind = 'group' ORDER BY name
+        ON CONFLICT (name) DO UPDATE SET gidnumber = EXCLUDED.gidnumber
+    """,
+    "users": f"""
+        INSERT INTO users (
+            name, uidnumber, primarygroup, givenname, sn, mail, loginshell, homedirectory,
+            passsha256, passbcrypt
+        )
+        SELECT DISTINCT ON (name)
+            name, number, primarygroup, givenname, sn, mail, loginshell, homedirectory,
+            passsha256, passbcrypt
+        FROM {DIRECTORY_STAGING_TABLE} WHERE kind = 'user' ORDER BY name
+        ON CONFLICT (name) DO UPDATE SET
+            uidnumber = EXCLUDED.uidnumber,
+            primarygroup = EXCLUDED.primarygroup,
+            givenname = COALESCE(NULLIF(EXCLUDED.givenname, ''), users.givenname),
+            sn = COALESCE(NULLIF(EXCLUDED.sn, ''), users.sn),
+            mail = COALESCE(NULLIF(EXCLUDED.mail, ''), users.mail),
+            loginshell = COALESCE(NULLIF(EXCLUDED.loginshell, ''), users.loginshell),
+            homedirectory = COALESCE(NULLIF(EXCLUDED.homedirectory, ''), users.homedirectory),
+            passsha256 = COALESCE(NULLIF(EXCLUDED.passsha256, ''), users.passsha256),
+            passbcrypt = COALESCE(NULLIF(EXCLUDED.passbcrypt, ''), users.passbcrypt)
+    """,
+    "memberships": f"""
+        UPDATE users SET othergroups = m.gidnumbers
+        FROM (
+            SELECT s.name, string_agg(DISTINCT g.gidnumber::text, ',') AS gidnumbers
+            FROM {DIRECTORY_STAGING_TABLE} s JOIN ldapgroups g ON g.name = s.target
+            WHERE s.kind = 'member'
+            GROUP BY s.name
+        ) m
+        WHERE users.name = m.name
+    """,
+    "included-groups": f"""
+        INSERT INTO includegroups (parentgroupid, includegroupid)
+        SELECT DISTINCT parent.gidnumber, child.gidnumber
+        FROM {DIRECTORY_STAGING_TABLE} s
+        JOIN ldapgroups parent ON parent.name = s.target
+        JOIN ldapgroups child ON child.name = s.name
+        WHERE s.kind = 'include' AND NOT EXISTS (
+            SELECT 1 FROM includegroups i
+            WHERE i.parentgroupid = parent.gidnumber AND i.includegroupid = child.gidnumber
+        )
+    """,
+    "capabilities": f"""
+        INSERT INTO capabilities (userid, action, object)
+        SELECT DISTINCT u.uidnumber, s.action, s.object
+        FROM {DIRECTORY_STAGING_TABLE} s JOIN users u ON u.name = s.name
+        WHERE s.kind = 'capability' AND NOT EXISTS (
+            SELECT 1 FROM capabilities c
+            WHERE c.userid = u.uidnumber AND c.action = s.action AND c.object = s.object
+        )
+    """,
+}
+
+
+def _staging_row(kind: str, name: str, **values: Any) -> tuple:
+    return kind, name, *(values.get(column) for column, _ in DIRECTORY_STAGING_COLUMNS[2:])
+
+
+def _staging_rows(record: DirectoryRecord) -> Iterator[tuple]:
+    if isinstance(record, DirectoryUser):
+        yield _staging_row(
+            "user",
+            record.name,
+            number=record.uid_number,
+            primarygroup=record.gid_number,
+            givenname=record.given_name,
+            sn=record.sn,
+            mail=record.mail,
+            loginshell=record.login_shell,
+            homedirectory=record.home_directory,
+            passsha256=record.password_sha256,
+            passbcrypt=record.password_bcrypt,
+        )
+        for action, object_ in record.capabilities:
+            yield _staging_row("capability", record.name, action=action, object=object_)
+        for group in record.groups:
+            yield _staging_row("member", record.name, target=group)
+    else:
+        yield _staging_row("group", record.name, number=record.gid_number)
+        for member in record.members:
+            yield _staging_row("member", member, target=record.name)
+        for included in record.included_groups:
+            yield _staging_row("include", included, target=record.name)
+        for group in record.groups:
+            yield _staging_row("include", record.name, target=group)
+
 
 class Base(DeclarativeBase):
     pass
@@ -43,13 +235,61 @@ class Capability(Base):
     object: Mapped[str] = mapped_column(default="*")
 
 
+def bind_accounts_upsert(
+    accounts: Sequence[tuple[str, str, str]], uid_number: int, gid_number: int
+) -> Insert:
+    """Build a single statement provisioning the groups, users and capability of bind accounts.
+
+    Each account is a tuple of user name, group name and password SHA256 hash.
+    The statement returns the names of the newly created users only.
+    """
+    group = (
+        insert(Group)
+        .values([
+            {"name": group_name, "gid_number": gid_number}
+            for group_name in dict.fromkeys(group_name for _, group_name, _ in accounts)
+        ])
+        .on_conflict_do_nothing(index_elements=[Group.name])
+        .cte("new_groups")
+    )
+    capability = (
+        insert(Capability)
+        .from_select(
+            [Capability.user_id, Capability.action, Capability.object],
+            select(literal(uid_number), literal("search"), literal("*")).where(
+                ~exists().where(Capability.user_id == uid_number)
+            ),
+        )
+        .cte("new_capability")
+    )
+    return (
+        insert(User)
+        .values([
+            {
+                "name": user_name,
+                "uid_number": uid_number,
+                "gid_number": gid_number,
+                "password_sha256": password_sha256,
+            }
+            for user_name, _, password_sha256 in accounts
+        ])
+        .on_conflict_do_nothing(index_elements=[User.name])
+        .returning(User.name)
+        .add_cte(group, capability)
+    )
+
+
 class Operation:
-    def __init__(self, dsn: str) -> None:
+    def __init__(self, dsn: str, pooled: bool = False) -> None:
         self._dsn = dsn
+        self._pooled = pooled
 
     def __enter__(self) -> "Operation":
-        engine = create_engine(self._dsn)
-        self._session = Session(engine)
+        self._session = Session(_get_engine(self._dsn, self._pooled))
+        if self._pooled:
+            self._session.execute(
+                text(f"SET LOCAL statement_timeout = {DATABASE_STATEMENT_TIMEOUT}")
+            )
         return self
 
     def __exit__(self, exc_type: Any, exc_val: Any, exc_tb: Any) -> None:
@@ -68,3 +308,90 @@ class Operation:
 
     def add(self, entity: Base) -> None:
         self._session.add(entity)
+
+    def provision_bind_accounts(
+        self, accounts: Sequence[tuple[str, str, str]], uid_number: int, gid_number: int
+    ) -> set[str]:
+        stmt = bind_accounts_upsert(accounts, uid_number, gid_number)
+        return set(self._session.scalars(stmt))
+
+    def update_password(self, user_name: str, password_sha256: str) -> bool:
+        stmt = update(User).where(User.name == user_name).values(password_sha256=password_sha256)
+        return self._session.execute(stmt).rowcount > 0
+
+    def create_indexes(self, indexes: Mapping[str, tuple[str, str]]) -> dict[str, bool]:
+        """Create the missing indexes and refresh the statistics of the tables changed.
+
+        Returns whether each index was created by this call, leaving out the
+        indexes whose table does not exist yet.
+        """
+        tables = set(
+            self._session.scalars(
+                text("SELECT tablename FROM pg_tables WHERE schemaname = current_schema()")
+            )
+        )
+        existing = set(
+            self._session.scalars(
+                text("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+            )
+        )
+
+        # Building an index on a large directory can outlast the statement timeout
+        self._session.execute(text("SET LOCAL statement_timeout = 0"))
+
+        result, analyze = {}, set()
+        for name, (table, expression) in indexes.items():
+            if table not in tables:
+                continue
+
+            if created := name not in existing:
+                self._session.execute(
+                    text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({expression})")
+                )
+                analyze.add(table)
+            result[name] = created
+
+        if analyze:
+            self._session.execute(text(f"ANALYZE {', '.join(sorted(analyze))}"))
+        return result
+
+    def import_directory(
+        self, records: Iterable[DirectoryRecord], progress: Callable[[str], None]
+    ) -> dict[str, int]:
+        """Stream the records into a staging table with COPY, then merge it set-based.
+
+        Only one record is held in memory at a time. Returns the number of
+        records read and of rows written by each merge.
+        """
+        # Merging a large directory can outlast the statement timeout
+        self._session.execute(text("SET LOCAL statement_timeout = 0"))
+        columns = ", ".join(f"{column} {type_}" for column, type_ in DIRECTORY_STAGING_COLUMNS)
+        self._session.execute(
+            text(f"CREATE TEMPORARY TABLE {DIRECTORY_STAGING_TABLE} ({columns}) ON COMMIT DROP")
+        )
+
+        count = 0
+        connection = self._session.connection()
+        driver_connection = connection.connection.driver_connection
+        try:
+            with driver_connection.cursor() as cursor:
+                names = ", ".join(column for column, _ in DIRECTORY_STAGING_COLUMNS)
+                with cursor.copy(f"COPY {DIRECTORY_STAGING_TABLE} ({names}) FROM STDIN") as copy:
+                    for count, record in enumerate(records, start=1):
+                        for row in _staging_rows(record):
+                            copy.write_row(row)
+                        if count % DIRECTORY_IMPORT_PROGRESS_INTERVAL == 0:
+                            progress(f"Streamed {count} records")
+        except connection.dialect.dbapi.Error as e:
+            # The driver COPY bypasses SQLAlchemy, which wraps the driver errors otherwise
+            raise DirectoryImportError(f"Failed to stream record {count}: {e}") from e
+        progress(f"Streamed {count} records, merging")
+
+        self._session.execute(text(f"ANALYZE {DIRECTORY_STAGING_TABLE}"))
+        summary = {"records": count}
+        for name, merge in DIRECTORY_MERGES.items():
+            summary[name] = self._session.execute(text(merge)).rowcount
+            progress(f"Merged {summary[name]} {name}")
+
+        self._session.execute(text("ANALYZE users, ldapgroups, includegroups, capabilities"))
+        return summary
@@ -0,0 +1,237 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import base64
+import binascii
+import csv
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from exceptions import DirectoryImportError
+
+DIRECTORY_FORMATS = ("csv", "ldif")
+
+# Separator of the multi-valued CSV cells, the commas being taken by CSV itself
+CSV_VALUE_SEPARATOR = ";"
+
+
+@dataclass(frozen=True)
+class DirectoryUser:
+    name: str
+    uid_number: int
+    gid_number: int
+    given_name: str = ""
+    sn: str = ""
+    mail: str = ""
+    login_shell: str = ""
+    home_directory: str = ""
+    password_sha256: str = ""
+    password_bcrypt: str = ""
+    groups: tuple[str, ...] = ()
+    capabilities: tuple[tuple[str, str], ...] = ()
+
+
+@dataclass(frozen=True)
+class DirectoryGroup:
+    name: str
+    gid_number: int
+    groups: tuple[str, ...] = ()
+    members: tuple[str, ...] = ()
+    included_groups: tuple[str, ...] = ()
+
+
+DirectoryRecord = Union[DirectoryUser, DirectoryGroup]
+
+
+def _number(value: Optional[str], attribute: str, lineno: int) -> int:
+    try:
+        return int(value or "")
+    except ValueError:
+        raise DirectoryImportError(f"Line {lineno}: invalid {attribute} '{value}'")
+
+
+def _values(cell: Optional[str]) -> tuple[str, ...]:
+    return tuple(
+        value.strip() for value in (cell or "").split(CSV_VALUE_SEPARATOR) if value.strip()
+    )
+
+
+def _capability(value: str, lineno: int) -> tuple[str, str]:
+    action, sep, object_ = value.partition(":")
+    if not sep:
+        raise DirectoryImportError(f"Line {lineno}: invalid capability '{value}'")
+    return action, object_
+
+
+def read_csv(lines: Iterable[str]) -> Iterator[DirectoryRecord]:
+    """Read the records of a CSV file with a header row.
+
+    The `kind` column tells a `user` row from a `group` one, and defaults to
+    `user`. A user's `gidnumber` is its primary group. The `groups` column
+    lists the names of the groups an entry is a member of, and `capabilities`
+    the `action:object` pairs of a user, both separated by semicolons.
+    """
+    reader = csv.DictReader(lines)
+    for row in reader:
+        lineno = reader.line_num
+        if not (name := (row.get("name") or "").strip()):
+            raise DirectoryImportError(f"Line {lineno}: missing name")
+
+        kind = (row.get("kind") or "user").strip().lower()
+        if kind == "group":
+            yield DirectoryGroup(
+                name=name,
+                gid_number=_number(row.get("gidnumber"), "gidnumber", lineno),
+                groups=_values(row.get("groups")),
+            )
+        elif kind == "user":
+            yield DirectoryUser(
+                name=name,
+                uid_number=_number(row.get("uidnumber"), "uidnumber", lineno),
+                gid_number=_number(row.get("gidnumber"), "gidnumber", lineno),
+                given_name=row.get("givenname") or "",
+                sn=row.get("sn") or "",
+                mail=row.get("mail") or "",
+                login_shell=row.get("loginshell") or "",
+                home_directory=row.get("homedirectory") or "",
+                password_sha256=row.get("passsha256") or "",
+                password_bcrypt=row.get("passbcrypt") or "",
+                groups=_values(row.get("groups")),
+                capabilities=tuple(
+                    _capability(value, lineno) for value in _values(row.get("capabilities"))
+                ),
+            )
+        else:
+            raise DirectoryImportError(f"Line {lineno}: unknown kind '{kind}'")
+
+
+def _b64decode(value: str, lineno: int) -> bytes:
+    try:
+        return base64.b64decode(value, validate=True)
+    except binascii.Error:
+        raise DirectoryImportError(f"Line {lineno}: invalid base64 value '{value}'")
+
+
+def _ldif_attribute(logical: str, lineno: int) -> tuple[str, str]:
+    attribute, sep, value = logical.partition(":")
+    if not sep:
+        raise DirectoryImportError(f"Line {lineno}: invalid line '{logical}'")
+    if value.startswith(":"):
+        value = _b64decode(value[1:].strip(), lineno).decode()
+    elif value.startswith("<"):
+        raise DirectoryImportError(f"Line {lineno}: URL values are not supported")
+    # Attribute options, e.g. `;lang-en`, are dropped
+    return attribute.split(";")[0].strip().lower(), value.strip()
+
+
+def _ldif_entries(lines: Iterable[str]) -> Iterator[tuple[int, dict[str, list[str]]]]:
+    """Yield the attributes of each LDIF entry with the line it starts at."""
+    entry: dict[str, list[str]] = {}
+    logical, start, entry_start = "", 0, 0
+
+    # A trailing blank line ends the last entry
+    for lineno, line in enumerate(chain(lines, [""]), start=1):
+        line = line.rstrip("\r\n")
+        if line.startswith(" "):
+            # A folded line continues the previous one
+            logical += line[1:]
+            continue
+
+        if logical and not logical.startswith("#"):
+            attribute, value = _ldif_attribute(logical, start)
+            entry.setdefault(attribute, []).append(value)
+
+        logical, start = line, lineno
+        if not line and entry:
+            yield entry_start, entry
+            entry = {}
+        elif line and not entry and not line.startswith("#"):
+            entry_start = lineno
+
+
+def _rdn_value(dn: str) -> str:
+    return dn.split(",")[0].partition("=")[2].strip()
+
+
+def _is_group_dn(dn: str) -> bool:
+    """Tell a group DN from a user one.
+
+    A `uid` RDN names a user, while a `cn` one names a group when it sits
+    under a groups OU, e.g. `cn=svcaccts,ou=groups,dc=glauth,dc=com`.
+    """
+    rdns = [rdn.strip().lower() for rdn in dn.split(",")]
+    if rdns[0].startswith("uid="):
+        return False
+    return any(rdn.startswith("ou=") and "group" in rdn for rdn in rdns[1:])
+
+
+def _passwords(values: list[str], lineno: int) -> tuple[str, str]:
+    password_sha256 = password_bcrypt = ""
+    for value in values:
+        scheme, _, hashed = value.partition("}")
+        scheme = scheme.lstrip("{").upper()
+        if scheme == "SHA256":
+            password_sha256 = _b64decode(hashed, lineno).hex()
+        elif scheme == "BCRYPT" or (scheme == "CRYPT" and hashed.startswith("$2")):
+            password_bcrypt = hashed.encode().hex()
+    return password_sha256, password_bcrypt
+
+
+def read_ldif(lines: Iterable[str]) -> Iterator[DirectoryRecord]:
+    """Read the posixAccount and posixGroup entries of an LDIF file.
+
+    A user is named after its `uid`, falling back to its `cn`. Its
+    `userPassword` is imported when hashed with the {SHA256} or bcrypt
+    schemes. The `memberUid` values of a group are users, while its `member`
+    and `uniqueMember` DNs are users or included groups depending on their
+    RDN and OU. Other entries, such as organizational units, are skipped.
+    """
+    for lineno, entry in _ldif_entries(lines):
+        if "dn" not in entry:
+            # The `version` line heading the file
+            continue
+
+        changetype = entry.get("changetype", ["add"])[0].lower()
+        if changetype != "add":
+            raise DirectoryImportError(f"Line {lineno}: unsupported changetype '{changetype}'")
+
+        object_classes = {value.lower() for value in entry.get("objectclass", [])}
+        name = (entry.get("uid") or entry.get("cn") or [""])[0]
+        if not name and object_classes & {"posixaccount", "posixgroup"}:
+            raise DirectoryImportError(f"Line {lineno}: missing uid or cn")
+
+        if "posixaccount" in object_classes:
+            password_sha256, password_bcrypt = _passwords(entry.get("userpassword", []), lineno)
+            yield DirectoryUser(
+                name=name,
+                uid_number=_number(entry.get("uidnumber", [""])[0], "uidNumber", lineno),
+                gid_number=_number(entry.get("gidnumber", [""])[0], "gidNumber", lineno),
+                given_name=entry.get("givenname", [""])[0],
+                sn=entry.get("sn", [""])[0],
+                mail=entry.get("mail", [""])[0],
+                login_shell=entry.get("loginshell", [""])[0],
+                home_directory=entry.get("homedirectory", [""])[0],
+                password_sha256=password_sha256,
+                password_bcrypt=password_bcrypt,
+                groups=tuple(_rdn_value(dn) for dn in entry.get("memberof", [])),
+            )
+        elif "posixgroup" in object_classes:
+            dns = entry.get("member", []) + entry.get("uniquemember", [])
+            yield DirectoryGroup(
+                name=entry.get("cn", [name])[0],
+                gid_number=_number(entry.get("gidnumber", [""])[0], "gidNumber", lineno),
+                members=(
+                    *entry.get("memberuid", []),
+                    *(_rdn_value(dn) for dn in dns if not _is_group_dn(dn)),
+                ),
+                included_groups=tuple(_rdn_value(dn) for dn in dns if _is_group_dn(dn)),
+            )
+
+
+def read_directory(path: Path, format_: str) -> Iterator[DirectoryRecord]:
+    """Stream the records of a directory file, one line at a time."""
+    reader = read_csv if format_ == "csv" else read_ldif
+    with path.open(newline="", encoding="utf-8") as f:
+        yield from reader(f)
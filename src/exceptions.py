@@ -8,3 +8,7 @@ class CharmError(Exception):
 
 class CertificatesError(CharmError):
     """Error for tls certificates related operations."""
+
+
+class DirectoryImportError(CharmError):
+    """Error for directory files which cannot be imported."""
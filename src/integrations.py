@@ -3,12 +3,12 @@
 
 import hashlib
 import ipaddress
+import json
 import logging
-import subprocess
-from contextlib import suppress
 from dataclasses import dataclass
+from functools import cached_property
 from secrets import token_hex
-from typing import List, Optional
+from typing import Callable, List, Optional, Sequence
 
 from charms.certificate_transfer_interface.v0.certificate_transfer import (
     CertificateTransferProvides,
@@ -18,15 +18,15 @@ from charms.glauth_utils.v0.glauth_auxiliary import AuxiliaryData
 from charms.tls_certificates_interface.v4.tls_certificates import (
     CertificateRequestAttributes,
     Mode,
+    PrivateKey,
     ProviderCertificate,
     TLSCertificatesRequiresV4,
 )
 from ops.charm import CharmBase
-from ops.pebble import PathError
-from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_fixed
+from ops.model import Relation, RelationDataContent
 
-from configs import DatabaseConfig, LdapServerConfig
 from constants import (
+    BIND_ACCOUNTS_KEY,
     CERTIFICATE_FILE,
     CERTIFICATES_INTEGRATION_NAME,
     CERTIFICATES_TRANSFER_INTEGRATION_NAME,
@@ -34,11 +34,16 @@ from constants import (
     DEFAULT_UID,
     GLAUTH_LDAP_PORT,
     GLAUTH_LDAPS_PORT,
+    PEER_INTEGRATION_NAME,
+    RESTART_GRANTED_KEY,
+    RESTART_IN_PROGRESS,
+    RESTART_KEY,
+    RESTART_REQUESTED,
     SERVER_CA_CERT,
     SERVER_CERT,
     SERVER_KEY,
 )
-from database import Capability, Group, Operation, User
+from database import Operation
 from exceptions import CertificatesError
 
 logger = logging.getLogger(__name__)
@@ -51,40 +56,8 @@ class BindAccount:
     password: Optional[str]
 
 
-def _reset_account_password(dsn: str, user_name: str) -> str:
-    password = token_hex()
-    password_sha256 = hashlib.sha256(password.encode()).hexdigest()
-    with Operation(dsn) as op:
-        if not (user := op.select(User, User.name == user_name)):
-            raise RuntimeError(f"No user '{user_name}' found")
-        user.password_sha256 = password_sha256
-        op.add(user)
-
-    return password
-
-
-def _create_bind_account(dsn: str, user_name: str, group_name: str) -> BindAccount:
-    with Operation(dsn) as op:
-        if not op.select(Group, Group.name == group_name):
-            group = Group(name=group_name, gid_number=DEFAULT_GID)
-            op.add(group)
-
-        user = op.select(User, User.name == user_name)
-        password = token_hex() if not user else ""
-        if not user:
-            user = User(
-                name=user_name,
-                uid_number=DEFAULT_UID,
-                gid_number=DEFAULT_GID,
-                password_sha256=hashlib.sha256(password.encode()).hexdigest(),
-            )
-            op.add(user)
-
-        if not op.select(Capability, Capability.user_id == DEFAULT_UID):
-            capability = Capability(user_id=DEFAULT_UID)
-            op.add(capability)
-
-    return BindAccount(user_name, group_name, password)
+def _hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
 
 
 class LdapIntegration:
@@ -92,21 +65,95 @@ class LdapIntegration:
         self._charm = charm
         self._bind_account: Optional[BindAccount] = None
 
+    @property
+    def _peer_app_data(self) -> Optional[RelationDataContent]:
+        if not (relation := self._charm.model.get_relation(PEER_INTEGRATION_NAME)):
+            return None
+        return relation.data[self._charm.app]
+
+    @property
+    def _ledger(self) -> dict[str, str]:
+        """The bind accounts already provisioned in the database, keyed by relation id.
+
+        The ledger lives in the peer application databag, so that a new leader
+        picks it up instead of provisioning every account again.
+        """
+        if (data := self._peer_app_data) is None:
+            return {}
+        return json.loads(data.get(BIND_ACCOUNTS_KEY, "{}"))
+
+    def _save_ledger(self, ledger: dict[str, str]) -> None:
+        if not self._charm.unit.is_leader() or (data := self._peer_app_data) is None:
+            return
+        if ledger != self._ledger:
+            data[BIND_ACCOUNTS_KEY] = json.dumps(ledger, sort_keys=True)
+
+    def invalidate_bind_accounts(self, relation_id: Optional[int] = None) -> None:
+        ledger = {}
+        if relation_id is not None:
+            ledger = self._ledger
+            ledger.pop(str(relation_id), None)
+        self._save_ledger(ledger)
+
     def load_bind_account(self, user: str, group: str, relation_id: int) -> None:
-        if LdapServerConfig.load(self._charm.ldap_requirer):
+        if self._charm.ldap_server_config:
             return self.load_bind_account_from_remote_ldap()
-        if not (database_config := DatabaseConfig.load(self._charm.database_requirer)):
-            return
 
-        self._bind_account = _create_bind_account(database_config.dsn, user, group)
-        if not self._bind_account.password:
-            password = self._charm.ldap_provider.get_bind_password(relation_id)
-            if not password:
-                password = _reset_account_password(database_config.dsn, user)
-            self._bind_account.password = password
+        bind_accounts = self.load_bind_accounts({relation_id: (user, group)})
+        self._bind_account = bind_accounts.get(relation_id)
+
+    def load_bind_accounts(self, requests: dict[int, tuple[str, str]]) -> dict[int, BindAccount]:
+        """Provision the bind accounts requested by ldap integrations in one transaction.
+
+        Accounts recorded in the ledger are answered from their secrets without
+        touching the database.
+        """
+        if not (database_config := self._charm.database_config):
+            return {}
+
+        ledger = self._ledger
+        bind_accounts, missing = {}, {}
+        for relation_id, (user, group) in requests.items():
+            if ledger.get(str(relation_id)) == f"{user}:{group}" and (
+                password := self._charm.get_bind_password(relation_id)
+            ):
+                bind_accounts[relation_id] = BindAccount(user, group, password)
+            else:
+                missing[relation_id] = (user, group)
+
+        if not missing:
+            return bind_accounts
+
+        passwords = {user: token_hex() for user, _ in missing.values()}
+        with Operation(database_config.dsn, pooled=database_config.pooled) as op:
+            created = op.provision_bind_accounts(
+                [
+                    (user, group, _hash_password(passwords[user]))
+                    for user, group in dict.fromkeys(missing.values())
+                ],
+                DEFAULT_UID,
+                DEFAULT_GID,
+            )
+
+            for relation_id, (user, group) in missing.items():
+                if user in created:
+                    password = passwords[user]
+                elif not (password := self._charm.get_bind_password(relation_id)):
+                    password = passwords[user]
+                    if not op.update_password(user, _hash_password(password)):
+                        raise RuntimeError(f"No user '{user}' found")
+                    created.add(user)
+
+                bind_accounts[relation_id] = BindAccount(user, group, password)
+
+        for relation_id, (user, group) in missing.items():
+            ledger[str(relation_id)] = f"{user}:{group}"
+        self._save_ledger(ledger)
+
+        return bind_accounts
 
     def load_bind_account_from_remote_ldap(self) -> None:
-        ldap_config = LdapServerConfig.load(self._charm.ldap_requirer)
+        ldap_config = self._charm.ldap_server_config
 
         if not ldap_config or not ldap_config.ldap_server:
             return
@@ -164,12 +211,15 @@ class LdapIntegration:
         if not self._bind_account:
             return None
 
+        return self.build_provider_data(self._bind_account)
+
+    def build_provider_data(self, bind_account: BindAccount) -> LdapProviderData:
         return LdapProviderData(
             urls=self.ldap_urls,
             ldaps_urls=self.ldaps_urls,
             base_dn=self.base_dn,
-            bind_dn=f"cn={self._bind_account.cn},ou={self._bind_account.ou},{self.base_dn}",
-            bind_password=self._bind_account.password,
+            bind_dn=f"cn={bind_account.cn},ou={bind_account.ou},{self.base_dn}",
+            bind_password=bind_account.password,
             auth_method="simple",
             starttls=self.starttls_enabled,
         )
@@ -181,7 +231,7 @@ class AuxiliaryIntegration:
 
     @property
     def auxiliary_data(self) -> AuxiliaryData:
-        if not (database_config := DatabaseConfig.load(self._charm.database_requirer)):
+        if not (database_config := self._charm.database_config):
             return AuxiliaryData()
 
         return AuxiliaryData(
@@ -192,6 +242,124 @@ class AuxiliaryIntegration:
         )
 
 
+class RollingRestartIntegration:
+    """Serialize the service restarts of the units through the peer integration.
+
+    A unit requests the lock in its unit databag, the leader grants it to at
+    most `max_unavailable` units at a time in the application databag, and a
+    unit releases it once its service passes the health checks again.
+    """
+
+    def __init__(self, charm: CharmBase):
+        self._charm = charm
+
+    @property
+    def _relation(self) -> Optional[Relation]:
+        return self._charm.model.get_relation(PEER_INTEGRATION_NAME)
+
+    @property
+    def _unit_data(self) -> RelationDataContent:
+        return self._relation.data[self._charm.unit]  # type: ignore[union-attr]
+
+    @property
+    def state(self) -> Optional[str]:
+        if not self._relation:
+            return None
+        return self._unit_data.get(RESTART_KEY)
+
+    @property
+    def granted(self) -> set[str]:
+        if not self._relation:
+            return set()
+        return set(json.loads(self._relation.data[self._charm.app].get(RESTART_GRANTED_KEY, "[]")))
+
+    def acquire(self) -> bool:
+        """Request the lock, returning whether the unit may restart right away."""
+        if not self._relation or not self._relation.units:
+            return True
+
+        self._unit_data[RESTART_KEY] = RESTART_REQUESTED
+        self.grant()
+        return self._charm.unit.name in self.granted
+
+    def restarting(self) -> None:
+        if self._relation:
+            self._unit_data[RESTART_KEY] = RESTART_IN_PROGRESS
+
+    def release(self) -> None:
+        if self.state is None:
+            return
+
+        del self._unit_data[RESTART_KEY]
+        self.grant()
+
+    def grant(self) -> None:
+        if not self._charm.unit.is_leader() or not (relation := self._relation):
+            return
+
+        requests = {
+            unit.name: state
+            for unit in relation.units | {self._charm.unit}
+            if (state := relation.data[unit].get(RESTART_KEY))
+        }
+        granted = {unit for unit in self.granted if unit in requests}
+        waiting = sorted(
+            unit
+            for unit, state in requests.items()
+            if state == RESTART_REQUESTED and unit not in granted
+        )
+        slots = max(self._charm.config.get("max_unavailable", 1) - len(granted), 0)
+        granted.update(waiting[:slots])
+
+        if granted != self.granted:
+            relation.data[self._charm.app][RESTART_GRANTED_KEY] = json.dumps(sorted(granted))
+
+
+class _LazyCertificateRequests(Sequence[CertificateRequestAttributes]):
+    """Certificate requests which are only built when the TLS library first reads them."""
+
+    def __init__(self, factory: Callable[[], list[CertificateRequestAttributes]]) -> None:
+        self._factory = factory
+
+    @cached_property
+    def _requests(self) -> list[CertificateRequestAttributes]:
+        return self._factory()
+
+    def __getitem__(self, index: int) -> CertificateRequestAttributes:  # type: ignore[override]
+        return self._requests[index]
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+
+@dataclass(frozen=True)
+class CertificatesSnapshot:
+    """The assigned certificate and private key, resolved once per dispatch."""
+
+    certificate: Optional[ProviderCertificate] = None
+    private_key: Optional[PrivateKey] = None
+
+    @property
+    def ready(self) -> bool:
+        return all((self.certificate, self.private_key))
+
+    @property
+    def ca_cert(self) -> Optional[str]:
+        return str(self.certificate.ca) if self.certificate else None
+
+    @property
+    def ca_chain(self) -> Optional[list[str]]:
+        return [str(chain) for chain in self.certificate.chain] if self.certificate else None
+
+    @property
+    def server_cert(self) -> Optional[str]:
+        return str(self.certificate.certificate) if self.certificate else None
+
+    @property
+    def server_key(self) -> Optional[str]:
+        return str(self.private_key) if self.private_key else None
+
+
 @dataclass
 class CertificateData:
     ca_cert: Optional[str] = None
@@ -204,10 +372,29 @@ class CertificatesIntegration:
         self._charm = charm
         self._container = charm._container
 
-        k8s_svc_host = f"{charm.app.name}.{charm.model.name}.svc.cluster.local"
+        self.cert_requirer = TLSCertificatesRequiresV4(
+            charm,
+            relationship_name=CERTIFICATES_INTEGRATION_NAME,
+            certificate_requests=[],
+            mode=Mode.UNIT,
+            refresh_events=[
+                charm.ingress_per_unit.on.ready_for_unit,
+                charm.ingress_per_unit.on.revoked_for_unit,
+                charm.ldaps_ingress_per_unit.on.ready_for_unit,
+                charm.ldaps_ingress_per_unit.on.revoked_for_unit,
+            ],
+        )
+        # Reading the ingress URLs is deferred until the certificate requests are needed
+        self.cert_requirer.certificate_requests = _LazyCertificateRequests(
+            lambda: [self.csr_attributes]
+        )
+
+    @cached_property
+    def csr_attributes(self) -> CertificateRequestAttributes:
+        k8s_svc_host = f"{self._charm.app.name}.{self._charm.model.name}.svc.cluster.local"
         sans_dns, sans_ip = [k8s_svc_host], []
 
-        for ingress in (charm.ingress_per_unit, charm.ldaps_ingress_per_unit):
+        for ingress in (self._charm.ingress_per_unit, self._charm.ldaps_ingress_per_unit):
             if ingress_url := ingress.url:
                 ingress_domain, *_ = ingress_url.rsplit(sep=":", maxsplit=1)
 
@@ -218,52 +405,33 @@ class CertificatesIntegration:
                 else:
                     sans_ip.append(ingress_domain)
 
-        self.csr_attributes = CertificateRequestAttributes(
+        return CertificateRequestAttributes(
             common_name=k8s_svc_host,
             sans_dns=frozenset(sans_dns),
             sans_ip=frozenset(sans_ip),
         )
-        self.cert_requirer = TLSCertificatesRequiresV4(
-            charm,
-            relationship_name=CERTIFICATES_INTEGRATION_NAME,
-            certificate_requests=[self.csr_attributes],
-            mode=Mode.UNIT,
-            refresh_events=[
-                charm.ingress_per_unit.on.ready_for_unit,
-                charm.ingress_per_unit.on.revoked_for_unit,
-                charm.ldaps_ingress_per_unit.on.ready_for_unit,
-                charm.ldaps_ingress_per_unit.on.revoked_for_unit,
-            ],
-        )
 
     @property
-    def _ca_cert(self) -> Optional[str]:
-        return str(self._certs.ca) if self._certs else None
-
-    @property
-    def _server_key(self) -> Optional[str]:
-        private_key = self.cert_requirer.private_key
-        return str(private_key) if private_key else None
-
-    @property
-    def _server_cert(self) -> Optional[str]:
-        return str(self._certs.certificate) if self._certs else None
-
-    @property
-    def _ca_chain(self) -> Optional[list[str]]:
-        return [str(chain) for chain in self._certs.chain] if self._certs else None
+    def snapshot(self) -> CertificatesSnapshot:
+        # `relation-get` for the certificates plus `secret-get` for the private key
+        return self._charm._dispatch_cache.get(
+            "certificates",
+            lambda: CertificatesSnapshot(
+                *self.cert_requirer.get_assigned_certificate(self.csr_attributes)
+            ),
+            calls=2,
+        )
 
-    @property
-    def _certs(self) -> Optional[ProviderCertificate]:
-        cert, *_ = self.cert_requirer.get_assigned_certificate(self.csr_attributes)
-        return cert
+    def invalidate_snapshot(self) -> None:
+        self._charm._dispatch_cache.invalidate("certificates")
 
     @property
     def cert_data(self) -> CertificateData:
+        snapshot = self.snapshot
         return CertificateData(
-            ca_cert=self._ca_cert,
-            ca_chain=self._ca_chain,
-            cert=self._server_cert,
+            ca_cert=snapshot.ca_cert,
+            ca_chain=snapshot.ca_chain,
+            cert=snapshot.server_cert,
         )
 
     def update_certificates(self) -> None:
@@ -277,46 +445,34 @@ class CertificatesIntegration:
             self._remove_certificates()
             return
 
-        self._prepare_certificates()
         self._push_certificates()
 
     def certs_ready(self) -> bool:
-        certs, private_key = self.cert_requirer.get_assigned_certificate(self.csr_attributes)
-        return all((certs, private_key))
-
-    def _prepare_certificates(self) -> None:
-        SERVER_CA_CERT.write_text(self._ca_cert)  # type: ignore[arg-type]
-        SERVER_KEY.write_text(self._server_key)  # type: ignore[arg-type]
-        SERVER_CERT.write_text(self._server_cert)  # type: ignore[arg-type]
+        return self.snapshot.ready
 
+    def _ca_bundle(self, ca_cert: str) -> str:
+        """Combine the base trust store with the issued CA certificate."""
         try:
-            for attempt in Retrying(
-                wait=wait_fixed(3),
-                stop=stop_after_attempt(3),
-                retry=retry_if_exception_type(subprocess.CalledProcessError),
-                reraise=True,
-            ):
-                with attempt:
-                    subprocess.run(
-                        ["update-ca-certificates", "--fresh"],
-                        check=True,
-                        text=True,
-                        capture_output=True,
-                    )
-        except subprocess.CalledProcessError as e:
-            logger.error(f"{e.stderr}")
+            base_bundle = CERTIFICATE_FILE.read_text()
+        except OSError as e:
+            logger.error(f"Failed to read the base trust store: {e}")
             raise CertificatesError("Update the TLS certificates failed.")
 
+        return f"{base_bundle.rstrip()}\n{ca_cert.strip()}\n"
+
     def _push_certificates(self) -> None:
-        self._container.push(CERTIFICATE_FILE, CERTIFICATE_FILE.read_text(), make_dirs=True)
-        self._container.push(SERVER_CA_CERT, self._ca_cert, make_dirs=True)
-        self._container.push(SERVER_KEY, self._server_key, make_dirs=True)
-        self._container.push(SERVER_CERT, self._server_cert, make_dirs=True)
+        snapshot = self.snapshot
+        self._charm._workload_files.sync({
+            CERTIFICATE_FILE: self._ca_bundle(snapshot.ca_cert),  # type: ignore[arg-type]
+            SERVER_CA_CERT: snapshot.ca_cert,
+            SERVER_KEY: snapshot.server_key,
+            SERVER_CERT: snapshot.server_cert,
+        })
 
     def _remove_certificates(self) -> None:
-        for file in (CERTIFICATE_FILE, SERVER_CA_CERT, SERVER_KEY, SERVER_CERT):
-            with suppress(PathError):
-                self._container.remove_path(file)
+        self._charm._workload_files.remove(
+            CERTIFICATE_FILE, SERVER_CA_CERT, SERVER_KEY, SERVER_CERT
+        )
 
 
 class CertificatesTransferIntegration:
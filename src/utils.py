@@ -1,18 +1,20 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import hashlib
 import logging
+import time
 from functools import wraps
 from typing import Any, Callable, Optional
 
 from ops import ModelError
 from ops.charm import CharmBase, EventBase
 from ops.model import BlockedStatus, WaitingStatus
-from tenacity import Retrying, TryAgain, wait_fixed
+from ops.pebble import CheckLevel, CheckStatus
 
 from constants import (
+    CONFIG_DELIVERY_CONFIGMAP,
     DATABASE_INTEGRATION_NAME,
-    GLAUTH_CONFIG_FILE,
     LDAP_CLIENT_INTEGRATION_NAME,
     SERVER_CERT,
     SERVER_KEY,
@@ -38,8 +40,15 @@ def service_not_ready(charm: CharmBase) -> ConditionEvaluation:
         service = charm._container.get_service(WORKLOAD_SERVICE)
     except (ModelError, RuntimeError):
         return True, "Pebble service is not ready"
-    is_not_running = not service.is_running()
-    return is_not_running, ("Pebble service is not ready" if is_not_running else "")
+    if not service.is_running():
+        return True, "Pebble service is not ready"
+
+    failing = [
+        name
+        for name, check in charm._container.get_checks(level=CheckLevel.READY).items()
+        if check.status == CheckStatus.DOWN
+    ]
+    return bool(failing), (f"Failing health checks: {', '.join(failing)}" if failing else "")
 
 
 def integration_not_exists(integration_name: str) -> Condition:
@@ -52,7 +61,7 @@ def integration_not_exists(integration_name: str) -> Condition:
 
 def tls_certificates_not_ready(charm: CharmBase) -> ConditionEvaluation:
     not_exists = charm.config.get("starttls_enabled", True) and not (
-        charm._container.exists(SERVER_KEY) and charm._container.exists(SERVER_CERT)
+        charm._workload_files.exists(SERVER_KEY, SERVER_CERT)
     )
     return not_exists, ("Missing TLS certificate and private key" if not_exists else "")
 
@@ -80,6 +89,12 @@ def backend_integration_not_exists(charm: CharmBase) -> ConditionEvaluation:
     return False, ""
 
 
+def max_unavailable_invalid(charm: CharmBase) -> ConditionEvaluation:
+    # No unit would ever be granted the rolling restart lock
+    invalid = charm.config.get("max_unavailable", 1) < 1
+    return invalid, ("Invalid config max_unavailable, it must be at least 1" if invalid else "")
+
+
 def backend_not_ready(charm: CharmBase) -> ConditionEvaluation:
     if charm.model.relations[DATABASE_INTEGRATION_NAME]:
         not_ready, msg = database_not_ready(charm)
@@ -94,6 +109,12 @@ def backend_not_ready(charm: CharmBase) -> ConditionEvaluation:
     return False, ""
 
 
+def _mark_reconcile_pending(charm: CharmBase) -> None:
+    # A single reconcile on a later dispatch picks up the work, instead of every
+    # event which hit an unmet condition being deferred and replayed
+    charm._stored.reconcile_pending = True
+
+
 def block_when(*conditions: Condition) -> Callable:
     def decorator(func: Callable) -> Callable:
         @wraps(func)
@@ -104,7 +125,7 @@ def block_when(*conditions: Condition) -> Callable:
             for condition in conditions:
                 resp, msg = condition(charm)
                 if resp:
-                    event.defer()
+                    _mark_reconcile_pending(charm)
                     charm.unit.status = BlockedStatus(msg)
                     return None
 
@@ -125,7 +146,7 @@ def wait_when(*conditions: Condition) -> Callable:
             for condition in conditions:
                 resp, msg = condition(charm)
                 if resp:
-                    event.defer()
+                    _mark_reconcile_pending(charm)
                     charm.unit.status = WaitingStatus(msg)
                     return None
 
@@ -147,22 +168,41 @@ def leader_unit(func: Callable) -> Callable:
     return wrapper
 
 
+def database_integrated(func: Callable) -> Callable:
+    # Skip the database steps silently on a deployment backed by a remote LDAP
+    # server, instead of waiting for a database which is never integrated
+    @wraps(func)
+    def wrapper(charm: CharmBase, *args: Any, **kwargs: Any) -> Optional[Any]:
+        if not charm.model.relations[DATABASE_INTEGRATION_NAME]:
+            return None
+
+        return func(charm, *args, **kwargs)
+
+    return wrapper
+
+
 def after_config_updated(func: Callable) -> Callable:
     @wraps(func)
     def wrapper(charm: CharmBase, *args: Any, **kwargs: Any) -> Optional[Any]:
-        if not charm.config_changed:
+        if not charm.config_changed or charm.config_delivery != CONFIG_DELIVERY_CONFIGMAP:
             return func(charm, *args, **kwargs)
 
-        charm.unit.status = WaitingStatus("Waiting for configuration to be updated")
-        for attempt in Retrying(
-            wait=wait_fixed(3),
-        ):
-            expected_config = charm.fetch_cm()
-            current_config = charm._container.pull(GLAUTH_CONFIG_FILE).read()
-            with attempt:
-                if expected_config != current_config:
-                    raise TryAgain
+        # The kubelet syncs the mounted ConfigMap on its own schedule. Instead of
+        # blocking the hook until it does, record the expected content and let a
+        # follow-up event finish the call
+        pending = charm._stored.pending_config
+        charm._stored.pending_config = {
+            "digest": hashlib.sha256(charm.config_file.content.encode()).hexdigest(),
+            "since": pending["since"] if pending else time.time(),
+            "restart": kwargs.get("restart", False) or bool(pending and pending["restart"]),
+            "timed_out": bool(pending and pending.get("timed_out")),
+        }
+        if charm.config_synced():
+            charm._stored.pending_config = None
+            return func(charm, *args, **kwargs)
 
-        return func(charm, *args, **kwargs)
+        logger.info("Waiting for the kubelet to sync the GLAuth configuration")
+        charm.unit.status = WaitingStatus("Waiting for configuration to be updated")
+        return None
 
     return wrapper
@@ -0,0 +1,62 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import hashlib
+import logging
+from contextlib import suppress
+from pathlib import Path
+from typing import Mapping
+
+from ops.charm import CharmBase
+from ops.pebble import PathError
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(content: str) -> str:
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+class WorkloadFiles:
+    """Keep the files the charm manages in the workload container in sync.
+
+    A manifest of the content digests pushed to the workload is kept in the
+    charm's stored state, so unchanged files are never pushed again and the
+    presence of a managed file is answered without asking Pebble. The
+    manifest must be reset whenever the workload container is recreated.
+    """
+
+    def __init__(self, charm: CharmBase) -> None:
+        self._container = charm._container
+        self._manifest = charm._stored.workload_files
+
+    def sync(self, files: Mapping[Path, str]) -> list[Path]:
+        """Push the files whose content differs from the manifest."""
+        changed = [
+            path
+            for path, content in files.items()
+            if self._manifest.get(str(path)) != _digest(content)
+        ]
+        for path in changed:
+            self._container.push(path, files[path], make_dirs=True)
+            self._manifest[str(path)] = _digest(files[path])
+
+        if changed:
+            logger.debug(f"Pushed {len(changed)} of {len(files)} workload files")
+        return changed
+
+    def remove(self, *paths: Path) -> None:
+        """Remove the managed files, skipping the ones which were never pushed."""
+        for path in paths:
+            if str(path) not in self._manifest:
+                continue
+
+            with suppress(PathError):
+                self._container.remove_path(path)
+            del self._manifest[str(path)]
+
+    def exists(self, *paths: Path) -> bool:
+        return all(str(path) in self._manifest for path in paths)
+
+    def reset(self) -> None:
+        self._manifest.clear()
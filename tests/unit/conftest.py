@@ -25,6 +25,7 @@ from constants import (
     CERTIFICATES_INTEGRATION_NAME,
     CERTIFICATES_TRANSFER_INTEGRATION_NAME,
     DATABASE_INTEGRATION_NAME,
+    PEER_INTEGRATION_NAME,
     WORKLOAD_CONTAINER,
 )
 
@@ -168,7 +169,7 @@ def mocked_certificates_transfer_integration(mocker: MockerFixture, harness: Har
 
 @pytest.fixture
 def mocked_tls_certificates(mocker: MockerFixture, harness: Harness) -> MagicMock:
-    return mocker.patch("ops.model.Container.exists", return_value=True)
+    return mocker.patch("workload.WorkloadFiles.exists", return_value=True)
 
 
 @pytest.fixture
@@ -178,6 +179,14 @@ def database_relation(harness: Harness) -> int:
     return relation_id
 
 
+@pytest.fixture
+def mocked_schema_operation(mocker: MockerFixture) -> MagicMock:
+    mocked = mocker.patch("charm.Operation")
+    mocked_op = mocked.return_value.__enter__.return_value
+    mocked_op.create_indexes.side_effect = lambda indexes: dict.fromkeys(indexes, True)
+    return mocked
+
+
 @pytest.fixture
 def database_resource(
     harness: Harness,
@@ -185,6 +194,7 @@ def database_resource(
     mocked_statefulset: MagicMock,
     database_relation: int,
     mocked_restart_glauth_service: Callable,
+    mocked_schema_operation: MagicMock,
 ) -> None:
     harness.update_relation_data(
         database_relation,
@@ -198,6 +208,11 @@ def database_resource(
     )
 
 
+@pytest.fixture
+def peer_relation(harness: Harness) -> int:
+    return harness.add_relation(PEER_INTEGRATION_NAME, harness.charm.app.name)
+
+
 @pytest.fixture
 def ldap_relation(harness: Harness) -> int:
     relation_id = harness.add_relation("ldap", LDAP_CLIENT_APP)
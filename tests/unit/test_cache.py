@@ -0,0 +1,39 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from unittest.mock import MagicMock
+
+from cache import DispatchCache
+
+
+class TestDispatchCache:
+    def test_get_memoizes_lookup(self) -> None:
+        cache = DispatchCache()
+        loader = MagicMock(return_value="value")
+
+        assert cache.get("key", loader, calls=2) == "value"
+        assert cache.get("key", loader, calls=2) == "value"
+
+        loader.assert_called_once()
+        assert cache.hits == 1
+        assert cache.saved_calls == 2
+
+    def test_get_memoizes_none(self) -> None:
+        cache = DispatchCache()
+        loader = MagicMock(return_value=None)
+
+        cache.get("key", loader)
+        cache.get("key", loader)
+
+        loader.assert_called_once()
+
+    def test_invalidate(self) -> None:
+        cache = DispatchCache()
+        loader = MagicMock(return_value="value")
+
+        cache.get("key", loader)
+        cache.invalidate("key")
+        cache.get("key", loader)
+
+        assert loader.call_count == 2
+        assert cache.hits == 0
@@ -1,6 +1,12 @@
 # Copyright 2023 Canonical Ltd.
 # See LICENSE file for licensing details.
 
+import hashlib
+import json
+import time
+from io import StringIO
+from pathlib import Path
+from typing import Iterator
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -16,14 +22,51 @@ from conftest import (
     LDAPS_PROVIDER_DATA,
 )
 from ops.model import ActiveStatus, BlockedStatus, MaintenanceStatus, WaitingStatus
-from ops.testing import Harness
+from ops.pebble import CheckInfo, CheckLevel, CheckStatus, PathError
+from ops.testing import ActionFailed, Harness
 from pytest_mock import MockerFixture
 
-from constants import WORKLOAD_CONTAINER, WORKLOAD_SERVICE
+from constants import (
+    GLAUTH_CONFIG_FILE,
+    LDAP_HEALTH_CHECK,
+    LDAPS_HEALTH_CHECK,
+    PEER_INTEGRATION_NAME,
+    WORKLOAD_CONTAINER,
+    WORKLOAD_SERVICE,
+)
+from database import SCHEMA_INDEXES
 from exceptions import CertificatesError
 from kubernetes_resource import KubernetesResourceError
 
 
+class TestCharmInit:
+    def test_resources_constructed_lazily(self, harness: Harness, k8s_client: MagicMock) -> None:
+        k8s_client.assert_not_called()
+        assert "config_file" not in vars(harness.charm)
+        assert "csr_attributes" not in vars(harness.charm._certs_integration)
+
+
+class TestMetricsEndpoint:
+    def test_scrape_job_targets_api_listener(self, harness: Harness) -> None:
+        relation_id = harness.add_relation("metrics-endpoint", "prometheus-k8s")
+        harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+
+        harness.update_config({"api_enabled": True})
+
+        jobs = json.loads(harness.get_relation_data(relation_id, harness.charm.app)["scrape_jobs"])
+        assert jobs[0]["metrics_path"] == "/metrics"
+        assert jobs[0]["static_configs"] == [{"targets": ["*:5555"]}]
+
+    def test_scrape_job_without_api_listener(self, harness: Harness) -> None:
+        relation_id = harness.add_relation("metrics-endpoint", "prometheus-k8s")
+        harness.add_relation_unit(relation_id, "prometheus-k8s/0")
+
+        harness.charm.on.config_changed.emit()
+
+        jobs = json.loads(harness.get_relation_data(relation_id, harness.charm.app)["scrape_jobs"])
+        assert jobs[0]["static_configs"] == [{"targets": []}]
+
+
 class TestInstallEvent:
     def test_on_install(self, harness: Harness, mocked_configmap: MagicMock) -> None:
         harness.charm.on.install.emit()
@@ -161,7 +204,88 @@ class TestDatabaseCreatedEvent:
         assert isinstance(harness.model.unit.status, ActiveStatus)
 
 
+class TestUpdateStatusEvent:
+    def test_skip_when_inputs_unchanged(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.update_status.emit()
+        mocked_update_config = mocker.patch("charm.GLAuthCharm._update_glauth_config")
+
+        harness.charm.on.update_status.emit()
+
+        mocked_update_config.assert_not_called()
+        assert isinstance(harness.model.unit.status, ActiveStatus)
+
+    def test_reconcile_when_inputs_changed(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.update_status.emit()
+        mocked_update_config = mocker.patch("charm.GLAuthCharm._update_glauth_config")
+
+        harness.charm._stored.reconcile_fingerprint = "stale"
+        harness.charm.on.update_status.emit()
+
+        mocked_update_config.assert_called_once()
+
+    def test_reconcile_when_secret_content_changed(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.update_status.emit()
+        mocked_update_config = mocker.patch("charm.GLAuthCharm._update_glauth_config")
+
+        # A rotated password changes the rendered configuration, not the databags
+        mocker.patch("configs.ConfigFile.__hash__", return_value=1)
+        harness.charm.on.update_status.emit()
+
+        mocked_update_config.assert_called_once()
+
+    def test_fingerprint_not_recorded_when_update_incomplete(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+    ) -> None:
+        harness.charm.on.update_status.emit()
+
+        assert harness.charm._stored.reconcile_fingerprint is None
+        assert isinstance(harness.model.unit.status, WaitingStatus)
+
+
 class TestConfigChangedEvent:
+    def test_invalid_resource_limits(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.update_config({"cpu": "abc", "memory": "1GB"})
+        harness.charm.on.update_status.emit()
+
+        environment = (
+            harness
+            .get_container_pebble_plan(WORKLOAD_CONTAINER)
+            .services[WORKLOAD_SERVICE]
+            .environment
+        )
+        assert "GOMAXPROCS" not in environment
+        assert "GOMEMLIMIT" not in environment
+
     def test_when_container_not_connected(
         self,
         harness: Harness,
@@ -227,6 +351,181 @@ class TestConfigChangedEvent:
         assert service.is_running()
         assert isinstance(harness.model.unit.status, ActiveStatus)
 
+    def test_config_delivered_by_pebble(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_configmap: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        container = harness.model.unit.get_container(WORKLOAD_CONTAINER)
+
+        harness.charm.on.config_changed.emit()
+
+        assert container.pull(GLAUTH_CONFIG_FILE).read() == harness.charm.config_file.content
+        mocked_configmap.patch.assert_not_called()
+
+    def test_config_delivered_by_configmap(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_configmap: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.update_config({"config_delivery": "configmap"})
+
+        mocked_configmap.patch.assert_called_once_with({
+            "glauth.cfg": harness.charm.config_file.content
+        })
+
+    def test_config_push_waits_for_configmap_unmount(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_configmap: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.update_config({"config_delivery": "configmap"})
+        container = harness.model.unit.get_container(WORKLOAD_CONTAINER)
+        mocked_push = mocker.patch.object(
+            harness.charm._container,
+            "push",
+            side_effect=PathError("generic-file-error", "read-only file system"),
+        )
+
+        harness.update_config({"config_delivery": "pebble"})
+
+        assert harness.model.unit.status == WaitingStatus(
+            "Waiting for the pod to unmount the ConfigMap"
+        )
+
+        mocked_push.side_effect = None
+        mocked_push.reset_mock()
+        harness.container_pebble_ready(WORKLOAD_CONTAINER)
+
+        mocked_push.assert_called_once()
+        assert container.get_service(WORKLOAD_SERVICE).is_running()
+        assert isinstance(harness.model.unit.status, ActiveStatus)
+
+    def test_restart_waits_for_rolling_restart_lock(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.config_changed.emit()
+        peer = f"{harness.charm.app.name}/1"
+        relation_id = harness.add_relation(PEER_INTEGRATION_NAME, harness.charm.app.name)
+        harness.add_relation_unit(relation_id, peer)
+        harness.update_relation_data(
+            relation_id, harness.charm.app.name, {"restart-granted": json.dumps([peer])}
+        )
+        harness.update_relation_data(relation_id, peer, {"restart": "restarting"})
+
+        with patch("charm.GLAuthCharm._restart_glauth_service") as mocked_restart:
+            harness.update_config({"ldaps_enabled": True})
+
+        mocked_restart.assert_called_once_with()
+        assert harness.model.unit.status == MaintenanceStatus(
+            "Waiting for the rolling restart lock"
+        )
+        assert harness.charm._rolling_restart.state == "requested"
+
+    def test_service_definition_change_waits_for_rolling_restart_lock(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.config_changed.emit()
+        container = harness.model.unit.get_container(WORKLOAD_CONTAINER)
+        planned = container.get_plan().services[WORKLOAD_SERVICE].to_dict()
+        peer = f"{harness.charm.app.name}/1"
+        relation_id = harness.add_relation(PEER_INTEGRATION_NAME, harness.charm.app.name)
+        harness.add_relation_unit(relation_id, peer)
+        harness.update_relation_data(
+            relation_id, harness.charm.app.name, {"restart-granted": json.dumps([peer])}
+        )
+        harness.update_relation_data(relation_id, peer, {"restart": "restarting"})
+
+        harness.update_config({"gogc": "50"})
+
+        assert container.get_plan().services[WORKLOAD_SERVICE].to_dict() == planned
+        assert harness.charm._rolling_restart.state == "requested"
+
+        harness.update_relation_data(relation_id, peer, {"restart": ""})
+
+        environment = container.get_plan().services[WORKLOAD_SERVICE].environment
+        assert environment["GOGC"] == "50"
+        assert harness.charm._rolling_restart.state == "restarting"
+
+    def test_lock_held_until_checks_pass_after_restart(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.config_changed.emit()
+        relation_id = harness.add_relation(PEER_INTEGRATION_NAME, harness.charm.app.name)
+        harness.add_relation_unit(relation_id, f"{harness.charm.app.name}/1")
+        checks = {
+            name: CheckInfo(name, CheckLevel.READY, CheckStatus.UP, successes=5)
+            for name in (LDAP_HEALTH_CHECK, LDAPS_HEALTH_CHECK)
+        }
+        mocker.patch.object(harness.charm._container, "get_checks", return_value=checks)
+
+        harness.update_config({"ldaps_enabled": True})
+
+        assert harness.charm._rolling_restart.state == "restarting"
+
+        for name in checks:
+            checks[name] = CheckInfo(name, CheckLevel.READY, CheckStatus.UP, successes=6)
+        harness.charm.on.update_status.emit()
+
+        assert harness.charm._rolling_restart.state is None
+
+    def test_invalid_max_unavailable_blocks_unit(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.update_config({"max_unavailable": 0})
+
+        assert harness.model.unit.status == BlockedStatus(
+            "Invalid config max_unavailable, it must be at least 1"
+        )
+
+    def test_termination_drains_connections(
+        self,
+        harness: Harness,
+        mocked_statefulset: MagicMock,
+    ) -> None:
+        harness.update_config({"drain_timeout": 60})
+
+        pod_spec_patches = [
+            call.args[0]["spec"]["template"]["spec"]
+            for call in mocked_statefulset.patch.call_args_list
+        ]
+        assert {
+            "terminationGracePeriodSeconds": 75,
+            "containers": [
+                {
+                    "name": WORKLOAD_CONTAINER,
+                    "lifecycle": {"preStop": {"sleep": {"seconds": 60}}},
+                },
+            ],
+        } in pod_spec_patches
+
     def test_enable_ldaps_changed_event(
         self,
         harness: Harness,
@@ -243,6 +542,129 @@ class TestConfigChangedEvent:
         assert isinstance(harness.model.unit.status, ActiveStatus)
 
 
+class TestPendingReconcile:
+    def test_pending_work_reconciled_once_at_commit(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+    ) -> None:
+        mocked_reconcile = mocker.patch("charm.GLAuthCharm._reconcile")
+        harness.charm._reconcile_pending = True
+
+        harness.framework.commit()
+        harness.framework.commit()
+
+        mocked_reconcile.assert_called_once()
+
+    def test_no_reconcile_during_action(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        mocked_reconcile = mocker.patch("charm.GLAuthCharm._reconcile")
+        monkeypatch.setenv("JUJU_ACTION_NAME", "import-directory")
+        harness.charm._stored.reconcile_pending = True
+        harness.charm._reconcile_pending = True
+
+        harness.framework.commit()
+
+        mocked_reconcile.assert_not_called()
+        assert harness.charm._stored.reconcile_pending
+
+    def test_reconcile_state_persisted(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm._stored.config_hash = None
+        harness.charm._reconcile_pending = True
+
+        harness.framework.commit()
+
+        snapshot = harness.framework._storage.load_snapshot(
+            harness.charm._stored._data.handle.path
+        )
+        assert snapshot["reconcile_pending"] is False
+        assert snapshot["config_hash"] is not None
+
+    def test_reconcile_clears_pending_marker(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm._stored.reconcile_pending = True
+
+        harness.charm._reconcile(MagicMock())
+
+        assert not harness.charm._stored.reconcile_pending
+        assert isinstance(harness.model.unit.status, ActiveStatus)
+
+    @pytest.mark.parametrize("leader", [True, False])
+    def test_reconcile_with_ldap_backend(
+        self,
+        harness: Harness,
+        leader: bool,
+        certificates_relation: int,
+        ldap_client_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.set_leader(leader)
+        harness.charm.on.glauth_pebble_ready.emit(
+            harness.model.unit.get_container(WORKLOAD_CONTAINER)
+        )
+        harness.charm._stored.reconcile_pending = True
+
+        harness.charm._reconcile(MagicMock())
+
+        assert not harness.charm._stored.reconcile_pending
+        assert isinstance(harness.model.unit.status, ActiveStatus)
+
+
+class TestPendingConfigSync:
+    def test_resume_once_config_synced(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+    ) -> None:
+        harness.charm._stored.pending_config = {
+            "digest": hashlib.sha256(b"synced").hexdigest(),
+            "since": time.time(),
+            "restart": True,
+        }
+        mocked_restart = mocker.patch("charm.GLAuthCharm._restart_glauth_service")
+
+        with patch("ops.model.Container.pull", return_value=StringIO("synced")):
+            harness.charm.on.update_status.emit()
+
+        mocked_restart.assert_called_once_with(restart=True)
+        assert harness.charm._stored.pending_config is None
+
+    def test_config_sync_timeout(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+    ) -> None:
+        harness.charm._stored.pending_config = {
+            "digest": hashlib.sha256(b"synced").hexdigest(),
+            "since": time.time() - 3600,
+            "restart": True,
+        }
+        mocked_restart = mocker.patch("charm.GLAuthCharm._restart_glauth_service")
+
+        with patch("ops.model.Container.pull", side_effect=lambda _: StringIO("stale")):
+            for _ in range(3):
+                harness.charm.on.update_status.emit()
+
+        mocked_restart.assert_not_called()
+        assert harness.charm._stored.config_sync_timeouts == 1
+        assert isinstance(harness.model.unit.status, BlockedStatus)
+
+
 class TestLdapRequestedEvent:
     def test_when_database_not_created(
         self,
@@ -295,6 +717,187 @@ class TestLdapRequestedEvent:
         assert LDAPS_PROVIDER_DATA.model_dump() == actual
 
 
+class TestBindAccountLedger:
+    def test_provisioned_account_loaded_without_database(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        database_resource: MagicMock,
+        peer_relation: int,
+    ) -> None:
+        mocker.patch("charm.GLAuthCharm.get_bind_password", return_value="password")
+        mocked_operation = mocker.patch("integrations.Operation")
+        harness.update_relation_data(
+            peer_relation, harness.charm.app.name, {"bind-accounts": '{"1": "user:group"}'}
+        )
+
+        harness.charm._ldap_integration.load_bind_account("user", "group", 1)
+
+        mocked_operation.assert_not_called()
+        assert harness.charm._ldap_integration.provider_data.bind_password == "password"
+
+    def test_account_provisioned_and_recorded(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        database_resource: MagicMock,
+        peer_relation: int,
+    ) -> None:
+        mocked_operation = mocker.patch("integrations.Operation")
+        mocked_op = mocked_operation.return_value.__enter__.return_value
+        mocked_op.provision_bind_accounts.return_value = {"user"}
+
+        harness.charm._ldap_integration.load_bind_account("user", "group", 1)
+
+        mocked_operation.assert_called_once()
+        peer_data = harness.get_relation_data(peer_relation, harness.charm.app.name)
+        assert json.loads(peer_data["bind-accounts"]) == {"1": "user:group"}
+
+    def test_ledger_invalidated_when_relation_broken(
+        self,
+        harness: Harness,
+        peer_relation: int,
+        ldap_relation: int,
+    ) -> None:
+        harness.update_relation_data(
+            peer_relation,
+            harness.charm.app.name,
+            {"bind-accounts": json.dumps({str(ldap_relation): "user:group"})},
+        )
+
+        harness.remove_relation(ldap_relation)
+
+        peer_data = harness.get_relation_data(peer_relation, harness.charm.app.name)
+        assert str(ldap_relation) not in json.loads(peer_data["bind-accounts"])
+
+
+class TestDatabaseSchema:
+    def test_indexes_created_once_per_database(
+        self,
+        harness: Harness,
+        mocked_tls_certificates: MagicMock,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_schema_operation: MagicMock,
+    ) -> None:
+        assert set(harness.charm._stored.schema_indexes) == set(SCHEMA_INDEXES)
+        mocked_schema_operation.reset_mock()
+
+        harness.charm.on.leader_elected.emit()
+
+        mocked_schema_operation.assert_not_called()
+
+    def test_retry_when_tables_missing(
+        self,
+        harness: Harness,
+        mocked_tls_certificates: MagicMock,
+        certificates_relation: int,
+        database_resource: MagicMock,
+        mocked_schema_operation: MagicMock,
+    ) -> None:
+        mocked_op = mocked_schema_operation.return_value.__enter__.return_value
+        mocked_op.create_indexes.side_effect = None
+        mocked_op.create_indexes.return_value = {"users_lower_name_idx": True}
+        harness.charm._stored.schema_indexes = []
+
+        harness.charm.on.leader_elected.emit()
+
+        assert list(harness.charm._stored.schema_indexes) == ["users_lower_name_idx"]
+        assert harness.charm._stored.reconcile_pending is True
+
+
+class TestImportDirectoryAction:
+    def test_import_directory_from_path(
+        self,
+        harness: Harness,
+        tmp_path: Path,
+        database_resource: MagicMock,
+        mocked_schema_operation: MagicMock,
+    ) -> None:
+        directory_file = tmp_path / "users.csv"
+        directory_file.write_text("name,uidnumber,gidnumber\nhackers,5002,5502\n")
+        mocked_op = mocked_schema_operation.return_value.__enter__.return_value
+        mocked_op.import_directory.return_value = {"records": 1, "users": 1}
+
+        output = harness.run_action("import-directory", {"path": str(directory_file)})
+
+        assert output.results == {"records": 1, "users": 1}
+        records, _ = mocked_op.import_directory.call_args.args
+        assert isinstance(records, Iterator)
+
+    def test_import_directory_unknown_format(
+        self,
+        harness: Harness,
+        database_resource: MagicMock,
+    ) -> None:
+        with pytest.raises(ActionFailed, match="Unknown directory format 'txt'"):
+            harness.run_action("import-directory", {"path": "/tmp/users.txt"})
+
+    def test_import_directory_resource_requires_format(
+        self,
+        harness: Harness,
+        database_resource: MagicMock,
+    ) -> None:
+        harness.add_resource("directory-import", "name,uidnumber,gidnumber\n")
+
+        with pytest.raises(ActionFailed, match="The format is required"):
+            harness.run_action("import-directory")
+
+    def test_import_directory_on_non_leader(self, harness: Harness) -> None:
+        harness.set_leader(False)
+
+        with pytest.raises(ActionFailed, match="leader unit"):
+            harness.run_action("import-directory", {"path": "/tmp/users.csv"})
+
+
+class TestLeaderElectedEvent:
+    def test_skip_database_steps_with_ldap_backend(
+        self,
+        harness: Harness,
+        certificates_relation: int,
+        ldap_client_resource: MagicMock,
+        mocked_tls_certificates: MagicMock,
+    ) -> None:
+        harness.charm.on.glauth_pebble_ready.emit(
+            harness.model.unit.get_container(WORKLOAD_CONTAINER)
+        )
+        harness.charm._stored.reconcile_pending = False
+
+        harness.charm.on.leader_elected.emit()
+
+        assert not harness.charm._stored.reconcile_pending
+        assert isinstance(harness.model.unit.status, ActiveStatus)
+
+    def test_provision_all_ldap_relations_in_one_operation(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        mocked_tls_certificates: MagicMock,
+        certificates_relation: int,
+        database_resource: MagicMock,
+    ) -> None:
+        mocked_operation = mocker.patch("integrations.Operation")
+        mocked_op = mocked_operation.return_value.__enter__.return_value
+        mocked_op.provision_bind_accounts.return_value = {"user1", "user2"}
+        harness.charm.on.config_changed.emit()
+
+        relation_ids = []
+        for idx in (1, 2):
+            relation_id = harness.add_relation("ldap", f"{LDAP_CLIENT_APP}{idx}")
+            harness.update_relation_data(
+                relation_id, f"{LDAP_CLIENT_APP}{idx}", {"user": f"user{idx}", "group": "group"}
+            )
+            relation_ids.append(relation_id)
+        mocked_operation.reset_mock()
+
+        harness.charm.on.leader_elected.emit()
+
+        mocked_operation.assert_called_once()
+        for idx, relation_id in enumerate(relation_ids, start=1):
+            actual = harness.get_relation_data(relation_id, harness.model.app.name)
+            assert actual["bind_dn"].startswith(f"cn=user{idx},ou=group")
+
+
 class TestLdapReadyEvent:
     def test_when_requirer_data_not_ready(
         self,
@@ -0,0 +1,119 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+import pytest
+
+from directory import DirectoryGroup, DirectoryUser, read_csv, read_ldif
+from exceptions import DirectoryImportError
+
+LDIF = """version: 1
+
+dn: ou=superheros,dc=glauth,dc=com
+objectClass: organizationalUnit
+
+dn: uid=hackers,ou=superheros,dc=glauth,dc=com
+objectClass: posixAccount
+uid: hackers
+uidNumber: 5002
+gidNumber: 5502
+mail: hackers@exa
+ mple.com
+userPassword:: e1NIQTI1Nn1aSGhvYmE5aXdQL3hUVGE1cmpwNzlpYjZwWWJvY3ZOYitGeUJHL0JDV3dZPQ==
+memberOf: cn=caped,ou=groups,dc=glauth,dc=com
+
+dn: cn=caped,ou=groups,dc=glauth,dc=com
+objectClass: posixGroup
+cn: caped
+gidNumber: 5505
+memberUid: johndoe
+member: cn=svcaccts,ou=groups,dc=glauth,dc=com
+"""
+
+
+class TestReadLdif:
+    def test_read_users_and_groups(self) -> None:
+        records = list(read_ldif(LDIF.splitlines(keepends=True)))
+
+        assert records == [
+            DirectoryUser(
+                name="hackers",
+                uid_number=5002,
+                gid_number=5502,
+                mail="hackers@example.com",
+                password_sha256="6478686daf62c0fff14d36b9ae3a7bf626faa586e872f35bf85c811bf0425b06",
+                groups=("caped",),
+            ),
+            DirectoryGroup(
+                name="caped",
+                gid_number=5505,
+                members=("johndoe",),
+                included_groups=("svcaccts",),
+            ),
+        ]
+
+    def test_user_and_group_sharing_a_name(self) -> None:
+        ldif = (
+            "dn: cn=johndoe,ou=groups,dc=glauth,dc=com\n"
+            "objectClass: posixGroup\n"
+            "cn: johndoe\n"
+            "gidNumber: 5001\n"
+            "\n"
+            "dn: cn=caped,ou=groups,dc=glauth,dc=com\n"
+            "objectClass: posixGroup\n"
+            "cn: caped\n"
+            "gidNumber: 5505\n"
+            "memberUid: johndoe\n"
+            "member: uid=janedoe,ou=people,dc=glauth,dc=com\n"
+            "uniqueMember: cn=johndoe,ou=people,dc=glauth,dc=com\n"
+        )
+
+        records = list(read_ldif(ldif.splitlines(keepends=True)))
+
+        assert records[1] == DirectoryGroup(
+            name="caped", gid_number=5505, members=("johndoe", "janedoe", "johndoe")
+        )
+
+    def test_reject_modify_records(self) -> None:
+        ldif = "dn: uid=hackers,dc=glauth,dc=com\nchangetype: delete\n"
+
+        with pytest.raises(DirectoryImportError, match="Line 1: unsupported changetype"):
+            list(read_ldif(ldif.splitlines(keepends=True)))
+
+    def test_reject_invalid_base64(self) -> None:
+        ldif = "dn: uid=hackers,dc=glauth,dc=com\nuserPassword:: not-base64!\n"
+
+        with pytest.raises(DirectoryImportError, match="Line 2: invalid base64 value"):
+            list(read_ldif(ldif.splitlines(keepends=True)))
+
+    def test_reject_unnamed_account(self) -> None:
+        ldif = "dn: ou=x,dc=glauth,dc=com\nobjectClass: posixAccount\nuidNumber: 5002\n"
+
+        with pytest.raises(DirectoryImportError, match="Line 1: missing uid or cn"):
+            list(read_ldif(ldif.splitlines(keepends=True)))
+
+
+class TestReadCsv:
+    def test_read_users_and_groups(self) -> None:
+        csv = (
+            "kind,name,uidnumber,gidnumber,groups,capabilities\n"
+            "group,svcaccts,,5503,caped,\n"
+            ",serviceuser,5004,5503,,search:*;search:ou=superheros\n"
+        )
+
+        records = list(read_csv(csv.splitlines(keepends=True)))
+
+        assert records == [
+            DirectoryGroup(name="svcaccts", gid_number=5503, groups=("caped",)),
+            DirectoryUser(
+                name="serviceuser",
+                uid_number=5004,
+                gid_number=5503,
+                capabilities=(("search", "*"), ("search", "ou=superheros")),
+            ),
+        ]
+
+    def test_reject_invalid_number(self) -> None:
+        csv = "name,uidnumber,gidnumber\nhackers,abc,5502\n"
+
+        with pytest.raises(DirectoryImportError, match="Line 2: invalid uidnumber 'abc'"):
+            list(read_csv(csv.splitlines(keepends=True)))
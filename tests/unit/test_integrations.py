@@ -0,0 +1,121 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from pathlib import Path
+from unittest.mock import MagicMock, PropertyMock
+
+import pytest
+from ops.testing import Harness
+from pytest_mock import MockerFixture
+
+from constants import CERTIFICATE_FILE, PEER_INTEGRATION_NAME, WORKLOAD_CONTAINER
+
+CA_CERT = "-----BEGIN CERTIFICATE-----\nca\n-----END CERTIFICATE-----"
+
+
+class TestCertificatesIntegration:
+    @pytest.fixture
+    def base_bundle(self, mocker: MockerFixture) -> str:
+        bundle = "-----BEGIN CERTIFICATE-----\nbase\n-----END CERTIFICATE-----\n"
+        mocker.patch.object(Path, "read_text", return_value=bundle)
+        return bundle
+
+    @pytest.fixture
+    def issued_certificates(
+        self, mocker: MockerFixture, harness: Harness, certificates_relation: int
+    ) -> None:
+        mocker.patch(
+            "integrations.CertificatesIntegration.snapshot",
+            new_callable=PropertyMock,
+            return_value=MagicMock(
+                ready=True, ca_cert=CA_CERT, server_cert=CA_CERT, server_key=CA_CERT
+            ),
+        )
+
+    def test_ca_bundle_includes_issued_ca(
+        self, harness: Harness, base_bundle: str, issued_certificates: None
+    ) -> None:
+        harness.charm._certs_integration.update_certificates()
+
+        container = harness.model.unit.get_container(WORKLOAD_CONTAINER)
+        bundle = container.pull(CERTIFICATE_FILE).read()
+        assert bundle.startswith(base_bundle)
+        assert bundle.endswith(f"{CA_CERT}\n")
+
+    def test_unchanged_ca_bundle_not_pushed(
+        self,
+        harness: Harness,
+        mocker: MockerFixture,
+        base_bundle: str,
+        issued_certificates: None,
+    ) -> None:
+        harness.charm._certs_integration.update_certificates()
+        mocked_push = mocker.patch.object(harness.charm._container, "push")
+
+        harness.charm._certs_integration.update_certificates()
+
+        pushed = [call.args[0] for call in mocked_push.call_args_list]
+        assert CERTIFICATE_FILE not in pushed
+
+    def test_assigned_certificate_resolved_once_per_dispatch(
+        self, harness: Harness, mocker: MockerFixture, certificates_relation: int
+    ) -> None:
+        mocked_get = mocker.patch.object(
+            harness.charm._certs_integration.cert_requirer,
+            "get_assigned_certificate",
+            return_value=(MagicMock(), MagicMock()),
+        )
+        certs_integration = harness.charm._certs_integration
+
+        assert certs_integration.certs_ready()
+        certs_integration.cert_data
+
+        mocked_get.assert_called_once()
+
+    def test_snapshot_invalidated(
+        self, harness: Harness, mocker: MockerFixture, certificates_relation: int
+    ) -> None:
+        mocked_get = mocker.patch.object(
+            harness.charm._certs_integration.cert_requirer,
+            "get_assigned_certificate",
+            return_value=(None, None),
+        )
+        certs_integration = harness.charm._certs_integration
+        assert not certs_integration.certs_ready()
+
+        mocked_get.return_value = (MagicMock(), MagicMock())
+        certs_integration.invalidate_snapshot()
+
+        assert certs_integration.certs_ready()
+
+
+class TestRollingRestartIntegration:
+    @pytest.fixture
+    def peer_relation(self, harness: Harness) -> int:
+        relation_id = harness.add_relation(PEER_INTEGRATION_NAME, harness.charm.app.name)
+        harness.add_relation_unit(relation_id, f"{harness.charm.app.name}/1")
+        return relation_id
+
+    def test_acquire_without_peers(self, harness: Harness) -> None:
+        assert harness.charm._rolling_restart.acquire()
+
+    def test_lock_granted_to_one_unit_at_a_time(
+        self, harness: Harness, peer_relation: int
+    ) -> None:
+        peer = f"{harness.charm.app.name}/1"
+        assert harness.charm._rolling_restart.acquire()
+        harness.charm._rolling_restart.restarting()
+
+        harness.update_relation_data(peer_relation, peer, {"restart": "requested"})
+        assert harness.charm._rolling_restart.granted == {harness.charm.unit.name}
+
+        harness.charm._rolling_restart.release()
+        assert harness.charm._rolling_restart.granted == {peer}
+
+    def test_max_unavailable(self, harness: Harness, peer_relation: int) -> None:
+        harness.update_config({"max_unavailable": 2})
+        peer = f"{harness.charm.app.name}/1"
+        harness.update_relation_data(peer_relation, peer, {"restart": "requested"})
+
+        assert harness.charm._rolling_restart.acquire()
+        assert harness.charm._rolling_restart.granted == {harness.charm.unit.name, peer}
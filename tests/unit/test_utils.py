@@ -6,9 +6,16 @@ from unittest.mock import MagicMock, PropertyMock, patch, sentinel
 
 from ops.charm import CharmBase, HookEvent
 from ops.model import ActiveStatus, BlockedStatus, WaitingStatus
+from ops.pebble import CheckStatus
 from ops.testing import Harness
 
-from constants import DATABASE_INTEGRATION_NAME, WORKLOAD_CONTAINER
+from configs import pebble_layer
+from constants import (
+    DATABASE_INTEGRATION_NAME,
+    LDAP_HEALTH_CHECK,
+    WORKLOAD_CONTAINER,
+    WORKLOAD_SERVICE,
+)
 from utils import (
     after_config_updated,
     block_when,
@@ -16,6 +23,7 @@ from utils import (
     database_not_ready,
     integration_not_exists,
     leader_unit,
+    service_not_ready,
     tls_certificates_not_ready,
     wait_when,
 )
@@ -57,6 +65,32 @@ class TestConditions:
 
         assert res is False and not msg
 
+    def test_service_ready(self, harness: Harness) -> None:
+        harness.container_pebble_ready(WORKLOAD_CONTAINER)
+        harness.charm._container.add_layer(
+            WORKLOAD_CONTAINER, pebble_layer(harness.charm.config), combine=True
+        )
+        harness.charm._container.start(WORKLOAD_SERVICE)
+
+        res, msg = service_not_ready(harness.charm)
+
+        assert res is False and not msg
+
+    def test_service_failing_health_checks(self, harness: Harness) -> None:
+        harness.container_pebble_ready(WORKLOAD_CONTAINER)
+        harness.charm._container.add_layer(
+            WORKLOAD_CONTAINER, pebble_layer(harness.charm.config), combine=True
+        )
+        harness.charm._container.start(WORKLOAD_SERVICE)
+
+        with patch(
+            "ops.model.Container.get_checks",
+            return_value={LDAP_HEALTH_CHECK: MagicMock(status=CheckStatus.DOWN)},
+        ):
+            res, msg = service_not_ready(harness.charm)
+
+        assert res is True and LDAP_HEALTH_CHECK in msg
+
     def test_database_not_ready(self, harness: Harness) -> None:
         res, msg = database_not_ready(harness.charm)
 
@@ -76,6 +110,8 @@ class TestConditions:
 
         assert wrapped(harness.charm, mocked_hook_event) is None
         assert isinstance(harness.model.unit.status, BlockedStatus)
+        assert harness.charm._stored.reconcile_pending
+        mocked_hook_event.defer.assert_not_called()
 
     def test_not_block_when(self, harness: Harness, mocked_hook_event: MagicMock) -> None:
         @block_when(container_not_connected)
@@ -93,6 +129,8 @@ class TestConditions:
 
         assert wrapped(harness.charm, mocked_hook_event) is None
         assert isinstance(harness.model.unit.status, WaitingStatus)
+        assert harness.charm._stored.reconcile_pending
+        mocked_hook_event.defer.assert_not_called()
 
     def test_not_wait_when(self, harness: Harness, mocked_hook_event: MagicMock) -> None:
         @wait_when(container_not_connected)
@@ -135,3 +173,17 @@ class TestUtils:
 
         assert wrapped(harness.charm, mocked_hook_event) is sentinel
         assert isinstance(harness.model.unit.status, ActiveStatus)
+
+    def test_after_config_updated_does_not_block(self, harness: Harness) -> None:
+        harness.update_config({"config_delivery": "configmap"})
+        harness.charm.config_changed = True
+
+        @after_config_updated
+        def wrapped(charm: CharmBase, restart: bool = False) -> sentinel:
+            return sentinel
+
+        with patch("ops.model.Container.pull", return_value=StringIO("stale")):
+            assert wrapped(harness.charm, restart=True) is None
+
+        assert isinstance(harness.model.unit.status, WaitingStatus)
+        assert harness.charm._stored.pending_config["restart"] is True
@@ -0,0 +1,39 @@
+# Copyright 2024 Canonical Ltd.
+# See LICENSE file for licensing details.
+
+from pathlib import Path
+
+from ops.testing import Harness
+from pytest_mock import MockerFixture
+
+FILE = Path("/etc/glauth/managed.txt")
+
+
+class TestWorkloadFiles:
+    def test_sync_pushes_changed_files_only(self, harness: Harness, mocker: MockerFixture) -> None:
+        workload_files = harness.charm._workload_files
+        workload_files.sync({FILE: "content"})
+        mocked_push = mocker.patch.object(harness.charm._container, "push")
+
+        assert workload_files.sync({FILE: "content"}) == []
+        assert workload_files.sync({FILE: "changed"}) == [FILE]
+        mocked_push.assert_called_once_with(FILE, "changed", make_dirs=True)
+
+    def test_exists_answered_from_manifest(self, harness: Harness) -> None:
+        workload_files = harness.charm._workload_files
+        assert not workload_files.exists(FILE)
+
+        workload_files.sync({FILE: "content"})
+        assert workload_files.exists(FILE)
+
+        workload_files.remove(FILE)
+        assert not workload_files.exists(FILE)
+        assert not harness.charm._container.exists(FILE)
+
+    def test_reset_pushes_files_again(self, harness: Harness) -> None:
+        workload_files = harness.charm._workload_files
+        workload_files.sync({FILE: "content"})
+
+        workload_files.reset()
+
+        assert workload_files.sync({FILE: "content"}) == [FILE]